@@ -2,12 +2,13 @@
 アセットを表すクラスを定義するモジュール。
 """
 
+import copy
 from enum import Enum
 
-import numpy as np
 import pandas as pd
 import yfinance as yf
 
+from data_fetcher.day_index import days_to_index, exchange_timezone, index_to_days
 from helper.config import Config
 
 
@@ -35,15 +36,27 @@ class Asset:
         アセットデータが換算されたかどうか。
     date_range : tuple
         データを取得できる日付の範囲。
+    timezone : str
+        取引所のタイムゾーン。
+    days : np.ndarray
+        データの各行の現地の日付を表す日番号。
+    closes : np.ndarray
+        データの各行の終値。
 
     Methods
     -------
     fetch_data(start_date: str = None, end_date: str = None, entirely: bool = False)
         指定された日付範囲のアセットデータを取得するメソッド。
-    convert_to_target_currency()
+    convert_to_target_currency(exchange_rate: pd.Series = None)
         アセットデータを目標通貨に換算するメソッド。
     fetch_exchange_rate(base_currency, target_currency, start_date, end_date)
         指定された日付範囲の為替レートを取得するメソッド。
+    trim(start_day: int, end_day: int)
+        データを指定された日番号の範囲に切り詰めるメソッド。
+    get_data_version()
+        取得済みのデータのバージョンを取得するメソッド。
+    clone()
+        価格データを共有し、書き換えた場合のみ複製されるアセットを作成するメソッド。
     """
     class Type(Enum):
         """
@@ -76,6 +89,9 @@ class Asset:
         self.target_currency = target_currency
         self.fillna_method = Config().config['fillna_method']
         self.is_converted = False
+        self.timezone = exchange_timezone(ticker)
+        self.days = None
+        self.closes = None
         self.date_range = self.__get_date_range()
 
     def __get_date_range(self):
@@ -118,38 +134,101 @@ class Asset:
                 self.data = ticker_obj.history(start=start_date, end=end_date)
             self.is_converted = False
             self.info['currency'] = ticker_obj.info['currency']
+            self.__index_days()
 
         except Exception as e:
             print(f"Error occurred while fetching data: {e}")
             self.data = None
             self.info = {}
+            self.days = None
+            self.closes = None
 
-    def convert_to_target_currency(self):
+    def __index_days(self):
+        """
+        データのインデックスを取引所の現地の日付の日番号に変換するプライベートメソッド。
+        取引や評価額の計算ではこの日番号と終値の配列を用いる。
+        """
+        if self.data.index.tz is not None:
+            self.timezone = str(self.data.index.tz)
+        self.days = index_to_days(self.data.index, self.timezone)
+        self.closes = self.data['Close'].to_numpy(dtype=float)
+        self.days.flags.writeable = False
+        self.closes.flags.writeable = False
+
+    def trim(self, start_day: int, end_day: int):
+        """
+        データを指定された日番号の範囲に切り詰めるメソッド。
+
+        Parameters
+        ----------
+        start_day : int
+            範囲の開始日の日番号。
+        end_day : int
+            範囲の終了日の日番号。
+        """
+        mask = (self.days >= start_day) & (self.days <= end_day)
+        self.data = self.data[mask]
+        self.__index_days()
+
+    def get_data_version(self):
+        """
+        取得済みのデータのバージョンを取得するメソッド。
+
+        データの期間、件数、最新の終値、換算先の通貨から計算するため、新しい日付のデータが追加されると変わる。
+        シミュレーション結果のキャッシュの無効化に用いる。
+
+        Returns
+        -------
+        str
+            データのバージョン。データがない場合はNone。
+        """
+        if self.days is None or len(self.days) == 0:
+            return None
+        currency = self.target_currency if self.is_converted else self.info.get('currency')
+        return f'{self.days[0]}-{self.days[-1]}-{len(self.days)}-{self.closes[-1]!r}-{currency}'
+
+    def clone(self):
+        """
+        価格データを共有し、書き換えた場合のみ複製されるアセットを作成するメソッド。
+
+        data、days、closes、exchange_rateは複製元と共有する。fetch_data、trim、convert_to_target_currencyは
+        これらを書き換えずに新しいオブジェクトに置き換えるため、複製の変更は複製元に影響しない。
+        days、closesは書き込み不可の配列とする。
+
+        Returns
+        -------
+        Asset
+            複製したアセット。
+        """
+        asset = copy.copy(self)
+        asset.info = dict(self.info)
+        return asset
+
+    def convert_to_target_currency(self, exchange_rate: pd.Series = None):
         """
         アセットデータを目標通貨に換算するメソッド。
+
+        Parameters
+        ----------
+        exchange_rate : pd.Series, optional
+            日付をインデックスとする為替レート。Portfolioが通貨ごとにまとめて取得したレートを渡す。
+            省略した場合はこのアセットの通貨の為替レートを取得する。
         """
         if self.is_converted:
             return
         if self.info['currency'] != self.target_currency:
-            self.exchange_rate = self.fetch_exchange_rate(self.info['currency'], self.target_currency,
-                                                          self.data.index.min(),
-                                                          self.data.index.max())
-            self.data = self.data.apply(self.__convert_row_to_target_currency, axis=1)
+            if exchange_rate is None:
+                exchange_rate = self.fetch_exchange_rate(self.info['currency'], self.target_currency,
+                                                         self.data.index.min(),
+                                                         self.data.index.max())
+            self.exchange_rate = exchange_rate
+            # 各行の現地の日付の為替レートを並べ、すべての行をまとめて換算する
+            rates = self.exchange_rate.reindex(days_to_index(self.days)).to_numpy()
+            self.data = self.data.mul(rates, axis=0)
             # Drop rows with NaN values
             self.data.dropna(inplace=True)
             self.is_converted = True
-
-    def __convert_row_to_target_currency(self, row):
-        """
-        行を目標通貨に換算するプライベートメソッド。
-        :param row:
-        """
-        date = pd.Timestamp(row.name.date())
-        if date in self.exchange_rate.index:
-            rate = self.exchange_rate.loc[date]
-            return row * rate
-        # Return NaN if the exchange rate is unknown
-        return pd.Series([np.nan] * len(row), index=row.index)
+            self.__index_days()
 
     def fetch_exchange_rate(self, base_currency, target_currency, start_date, end_date):
         """
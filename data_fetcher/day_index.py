@@ -0,0 +1,147 @@
+"""
+日付を整数の日番号で表すための関数を定義するモジュール。
+
+日番号は取引所の現地の日付を1970-01-01からの経過日数で表したものである。
+データの取得時に一度だけ日番号に変換し、取引や評価額の計算では整数の比較のみを行う。
+Timestampとの相互変換はAPIの境界でのみ行う。
+"""
+
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 86400 * 10 ** 9
+
+# ティッカーの接尾辞と取引所のタイムゾーンの対応
+EXCHANGE_TIMEZONES = {
+    '.T': 'Asia/Tokyo',
+    '.HK': 'Asia/Hong_Kong',
+    '.L': 'Europe/London',
+    '.PA': 'Europe/Paris',
+    '.DE': 'Europe/Berlin',
+    '=X': 'Europe/London',
+}
+DEFAULT_TIMEZONE = 'America/New_York'
+
+
+def exchange_timezone(ticker: str):
+    """
+    ティッカーから取引所のタイムゾーンを推定する関数。
+
+    Parameters
+    ----------
+    ticker : str
+        ティッカーシンボル。
+
+    Returns
+    -------
+    str
+        タイムゾーン名。該当する接尾辞がない場合は'America/New_York'。
+    """
+    for suffix, timezone in EXCHANGE_TIMEZONES.items():
+        if ticker is not None and ticker.endswith(suffix):
+            return timezone
+    return DEFAULT_TIMEZONE
+
+
+def to_day(date):
+    """
+    日付を日番号に変換する関数。
+
+    タイムゾーン付きの日付はそのタイムゾーンでの現地の日付を用いる。
+
+    Parameters
+    ----------
+    date : str or Timestamp or int
+        変換する日付。整数の場合は日番号とみなしてそのまま返す。
+
+    Returns
+    -------
+    int
+        日番号。
+    """
+    if isinstance(date, (int, np.integer)):
+        return int(date)
+    timestamp = pd.Timestamp(date)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_localize(None)
+    return timestamp.value // NS_PER_DAY
+
+
+def to_days(dates):
+    """
+    日付のリストを日番号の配列に変換する関数。
+
+    Parameters
+    ----------
+    dates : list or np.ndarray or pd.DatetimeIndex
+        変換する日付。整数のリストや配列の場合は日番号とみなしてそのまま返す。
+
+    Returns
+    -------
+    np.ndarray
+        日番号の配列（int64）。
+    """
+    if not isinstance(dates, (pd.Index, pd.Series)):
+        # 整数のリストをpd.to_datetimeに渡すとナノ秒とみなされるため、先に判定する
+        values = np.asarray(dates)
+        if np.issubdtype(values.dtype, np.integer):
+            return values.astype(np.int64)
+    return index_to_days(pd.to_datetime(dates))
+
+
+def index_to_days(index, timezone: str = None):
+    """
+    DatetimeIndexを日番号の配列に変換する関数。
+
+    Parameters
+    ----------
+    index : pd.DatetimeIndex
+        変換するインデックス。
+    timezone : str, optional
+        現地の日付を求めるタイムゾーン。省略した場合はインデックスのタイムゾーンをそのまま用いる。
+
+    Returns
+    -------
+    np.ndarray
+        日番号の配列（int64）。
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        if timezone is not None:
+            index = index.tz_convert(timezone)
+        index = index.tz_localize(None)
+    return index.asi8 // NS_PER_DAY
+
+
+def to_timestamp(day: int):
+    """
+    日番号をTimestampに変換する関数。
+
+    Parameters
+    ----------
+    day : int
+        日番号。
+
+    Returns
+    -------
+    Timestamp
+        タイムゾーンなしの日付。
+    """
+    return pd.Timestamp(int(day) * NS_PER_DAY)
+
+
+def days_to_index(days):
+    """
+    日番号の配列をDatetimeIndexに変換する関数。
+
+    Parameters
+    ----------
+    days : np.ndarray
+        日番号の配列。
+
+    Returns
+    -------
+    pd.DatetimeIndex
+        タイムゾーンなしの日付のインデックス。
+    """
+    return pd.DatetimeIndex(np.asarray(days, dtype=np.int64) * NS_PER_DAY)
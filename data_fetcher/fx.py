@@ -0,0 +1,194 @@
+"""
+ポートフォリオ全体の為替レートを管理するクラスを定義するモジュール。
+
+各通貨の対米ドルのレートのみを取得し、それ以外の通貨の組み合わせはクロスレートとして計算する
+（例: EURJPY = EURUSD × USDJPY）。アセットごとに為替レートを取得する場合と比べて、取得回数を通貨の数に抑える。
+"""
+
+import copy
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from helper.config import Config
+
+
+class FxMatrix:
+    """
+    対米ドルのレートから任意の通貨の組み合わせの為替レートを求めるクラス。
+
+    Attributes
+    ----------
+    usd_rates : pd.DataFrame
+        日付をインデックス、通貨を列とする1米ドルあたりの各通貨の金額。
+    fillna_method : str
+        欠損値を埋める方法。
+    coverage : dict
+        通貨をキー、取得済みの期間の開始日と終了日の組を値とする辞書。
+
+    Methods
+    -------
+    fetch(currencies: list, start_date, end_date)
+        指定した通貨の対米ドルのレートを取得するメソッド。
+    add_rates(usd_rates: pd.DataFrame)
+        対米ドルのレートを追加するメソッド。
+    rate(base_currency: str, target_currency: str)
+        基準通貨を換算先の通貨に換算する為替レートを取得するメソッド。
+    convert(prices: pd.DataFrame, currencies: list, target_currency: str)
+        通貨の異なる価格行列をまとめて換算するメソッド。
+    clone()
+        為替レートを共有し、書き換えた場合のみ複製されるFxMatrixを作成するメソッド。
+    """
+    BASE_CURRENCY = 'USD'
+
+    def __init__(self):
+        """
+        FxMatrixクラスの初期化メソッド。
+        """
+        self.usd_rates = pd.DataFrame(dtype=float)
+        self.fillna_method = Config().config['fillna_method']
+        self.coverage = {}
+        self.__rates = {}
+
+    def fetch(self, currencies, start_date, end_date):
+        """
+        指定した通貨の対米ドルのレートを取得するメソッド。
+
+        取得済みの期間に指定した期間が含まれる通貨は再取得しない。含まれない通貨は、取得済みの期間と
+        指定した期間を合わせた期間で取得し直す。
+
+        Parameters
+        ----------
+        currencies : list
+            必要な通貨のリスト。
+        start_date : str
+            為替レートを取得する開始日。
+        end_date : str
+            為替レートを取得する終了日。
+        """
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        legs = {}
+        ranges = {}
+        for currency in sorted(set(currencies) - {self.BASE_CURRENCY}):
+            covered_start, covered_end = self.coverage.get(currency, (start, start - pd.Timedelta(days=1)))
+            if covered_start <= start and end <= covered_end:
+                continue
+            fetch_start, fetch_end = min(start, covered_start), max(end, covered_end)
+            try:
+                data = yf.Ticker(f'{self.BASE_CURRENCY}{currency}=X').history(
+                    start=fetch_start.strftime('%Y-%m-%d'), end=fetch_end.strftime('%Y-%m-%d'))
+                data.index = pd.DatetimeIndex(data.index.date)
+                legs[currency] = data['Close']
+                ranges[currency] = (fetch_start, fetch_end)
+            except Exception as e:
+                print(f"Error occurred while fetching exchange rate: {e}")
+        if legs:
+            self.add_rates(pd.DataFrame(legs))
+            self.coverage.update(ranges)
+
+    def add_rates(self, usd_rates: pd.DataFrame):
+        """
+        対米ドルのレートを追加するメソッド。取得済みの通貨と日付は追加したレートで上書きする。
+
+        Parameters
+        ----------
+        usd_rates : pd.DataFrame
+            日付をインデックス、通貨を列とする1米ドルあたりの各通貨の金額。
+        """
+        rates = usd_rates.combine_first(self.usd_rates) if len(self.usd_rates.columns) else usd_rates
+        for currency in usd_rates.columns:
+            dates = usd_rates[currency].dropna().index
+            if len(dates) == 0:
+                continue
+            covered = self.coverage.get(currency, (dates.min(), dates.max()))
+            self.coverage[currency] = (min(covered[0], dates.min()), max(covered[1], dates.max()))
+        # 暦日のインデックスに揃えて、休日の為替レートを埋める
+        date_range = pd.date_range(start=rates.index.min(), end=rates.index.max())
+        rates = rates.reindex(date_range)
+        if self.fillna_method == 'ffill':
+            rates = rates.ffill()
+        elif self.fillna_method == 'bfill':
+            rates = rates.bfill()
+        self.usd_rates = rates
+        self.__rates = {}
+
+    def clone(self):
+        """
+        為替レートを共有し、書き換えた場合のみ複製されるFxMatrixを作成するメソッド。
+
+        usd_ratesはfetch、add_ratesで新しいDataFrameに置き換えるため複製元と共有し、
+        取得済みの期間とクロスレートのキャッシュの辞書のみを新しく作る。
+
+        Returns
+        -------
+        FxMatrix
+            複製したFxMatrix。
+        """
+        fx = copy.copy(self)
+        fx.coverage = dict(self.coverage)
+        fx.__rates = dict(self.__rates)
+        return fx
+
+    def rate(self, base_currency: str, target_currency: str):
+        """
+        基準通貨を換算先の通貨に換算する為替レートを取得するメソッド。
+
+        Parameters
+        ----------
+        base_currency : str
+            基準となる通貨の種類。
+        target_currency : str
+            換算する通貨の種類。
+
+        Returns
+        -------
+        pd.Series
+            日付をインデックスとする為替レート。
+        """
+        key = (base_currency, target_currency)
+        if key not in self.__rates:
+            base = self.__usd_rate(base_currency)
+            target = self.__usd_rate(target_currency)
+            rate = target / base
+            rate.name = f'{base_currency}{target_currency}'
+            self.__rates[key] = rate
+        return self.__rates[key]
+
+    def __usd_rate(self, currency: str):
+        """
+        1米ドルあたりの通貨の金額を取得するプライベートメソッド。
+        """
+        if currency == self.BASE_CURRENCY:
+            return pd.Series(1.0, index=self.usd_rates.index)
+        if currency not in self.usd_rates.columns:
+            raise ValueError(f'Exchange rate not fetched for currency: {currency}')
+        return self.usd_rates[currency]
+
+    def convert(self, prices: pd.DataFrame, currencies, target_currency: str):
+        """
+        通貨の異なる価格行列をまとめて換算するメソッド。
+
+        各列の為替レートを並べた行列を作り、価格行列との要素ごとの積を1回で計算する。
+
+        Parameters
+        ----------
+        prices : pd.DataFrame
+            日付をインデックス、銘柄を列とする価格行列。
+        currencies : list
+            各列の通貨の種類。
+        target_currency : str
+            換算する通貨の種類。
+
+        Returns
+        -------
+        pd.DataFrame
+            換算後の価格行列。為替レートがない日付はNaNとなる。
+        """
+        index = pd.DatetimeIndex(prices.index)
+        index = index.tz_localize(None) if index.tz is not None else index
+        factors = np.column_stack([
+            np.ones(len(index)) if currency == target_currency
+            else self.rate(currency, target_currency).reindex(index.normalize()).to_numpy()
+            for currency in currencies])
+        return prices * factors
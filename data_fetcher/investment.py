@@ -2,9 +2,14 @@
 投資を表すクラスと取引を表すクラスを定義するモジュール。
 """
 
+import copy
 from enum import Enum
+
+import numpy as np
 import pandas as pd
-from pandas import Timestamp
+
+from data_fetcher.day_index import days_to_index, to_day, to_days, to_timestamp
+from data_fetcher.tax_lot import TaxLedger
 
 
 class Trade:
@@ -13,6 +18,8 @@ class Trade:
 
     Attributes
     ----------
+    day : int
+        取引の日付を表す日番号。
     date : Timestamp
         取引の日付。
     trade_type : TradeType
@@ -22,7 +29,7 @@ class Trade:
     tax_rate : float
         取引にかかる税率。
     average_share_price : float
-        取引の平均株価。
+        取引後の保有口数1口あたりの取得価額。Investment.get_tax_reportで台帳に記録したときに設定する。
 
     Methods
     -------
@@ -41,8 +48,8 @@ class Trade:
 
         Parameters
         ----------
-        date : str
-            取引の日付。
+        date : str or int
+            取引の日付。整数の場合は日番号とみなす。
         trade_type : TradeType
             取引の種類（購入または売却）。
         amount : float
@@ -50,16 +57,24 @@ class Trade:
         tax_rate : float
             取引にかかる税率。
         """
-        self.date = Timestamp(date)
-        if self.date.tzinfo is None:
-            self.date = self.date.tz_localize('America/New_York')
-        else:
-            self.date = self.date.tz_convert('America/New_York')
+        self.day = to_day(date)
         self.trade_type = trade_type
         self.amount = amount
         self.tax_rate = tax_rate
         self.average_share_price = None
 
+    @property
+    def date(self):
+        """
+        取引の日付を取得するプロパティ。
+
+        Returns
+        -------
+        Timestamp
+            取引所の現地の日付。
+        """
+        return to_timestamp(self.day)
+
 
 class Investment:
     """
@@ -78,6 +93,12 @@ class Investment:
         指定した日付での投資の状態を取得するメソッド。
     record_trade(date: str, trade_type: TradeType, amount: float)
         取引を記録するメソッド。
+    record_trades(dates: list, trade_type: TradeType, amounts: np.ndarray)
+        複数の取引を一括で記録するメソッド。
+    get_tax_report(dates: list, method: TaxLedger.Method = TaxLedger.Method.FIFO, tax_rate: float = None)
+        指定した日付ごとの実現損益、含み損益、税額を取得するメソッド。
+    clone(with_trades: bool = True)
+        価格データを共有し、取引の記録を複製した投資を作成するメソッド。
     """
     def __init__(self, asset):
         """
@@ -105,17 +126,17 @@ class Investment:
         dict
             指定した日付での投資の状態。
         """
-        date = Timestamp(date).tz_localize('America/New_York')
-        if date not in self.asset.data.index:
-            previous_date = self.asset.data.index[self.asset.data.index < date].max()
-            if pd.isna(previous_date):
-                raise ValueError(f"No data available for date: {date} and before")
-            date = previous_date
+        day = to_day(date)
+        # 指定した日付以前で最も新しい取引日の位置
+        position = np.searchsorted(self.asset.days, day, side='right') - 1
+        if position < 0:
+            raise ValueError(f"No data available for date: {date} and before")
+        day = self.asset.days[position]
         shares = 0
         average_share_price = 0
         # tradesを過去の取引から順に見ていく
-        for trade in sorted(self.trades, key=lambda x: x.date):
-            if trade.date <= date:
+        for trade in sorted(self.trades, key=lambda x: x.day):
+            if trade.day <= day:
                 if trade.trade_type == Trade.Type.BUY:
                     # 過去の取引での購入価格の総額
                     temp_principal = shares * average_share_price
@@ -128,7 +149,7 @@ class Investment:
         average_share_price = average_share_price if shares > 0 else 0
         shares = shares if shares > 0 else 0
         principal = shares * average_share_price
-        valuation = self.asset.data.loc[date, 'Close'] * shares
+        valuation = self.asset.closes[position] * shares
         return average_share_price, shares, principal, valuation
 
     def record_trade(self, date: str, trade_type: Trade.Type, amount: int):
@@ -144,12 +165,104 @@ class Investment:
         amount : float
             取引の金額。
         """
-        if date not in self.asset.data.index:
-            next_date = self.asset.data.index[self.asset.data.index > date].min()
-            if pd.isna(next_date):
-                raise ValueError(f"No data available for date: {date} and onwards")
-            date = next_date
-        trade = Trade(date, trade_type, amount)
-        closing_price = self.asset.data.loc[date, 'Close']
-        trade.quantity = amount / closing_price
+        # 指定した日付以降で最も古い取引日の位置
+        position = np.searchsorted(self.asset.days, to_day(date), side='left')
+        if position == len(self.asset.days):
+            raise ValueError(f"No data available for date: {date} and onwards")
+        trade = Trade(self.asset.days[position], trade_type, amount)
+        trade.quantity = amount / self.asset.closes[position]
         self.trades.append(trade)
+
+    def record_trades(self, dates, trade_type: Trade.Type, amounts):
+        """
+        複数の取引を一括で記録するメソッド。
+
+        取引日の検索と口数の計算を配列で一括して行う。取引日でない日付は次の取引日に取引する。
+
+        Parameters
+        ----------
+        dates : list or np.ndarray
+            取引の日付のリスト。日番号の配列でもよい。
+        trade_type : TradeType
+            取引の種類（購入または売却）。
+        amounts : float or np.ndarray
+            取引の金額。日付ごとに指定することもできる。
+        """
+        days = to_days(dates)
+        amounts = np.broadcast_to(np.asarray(amounts, dtype=float), days.shape)
+        positions = np.searchsorted(self.asset.days, days, side='left')
+        if len(positions) > 0 and positions.max() == len(self.asset.days):
+            raise ValueError(f"No data available for date: {to_timestamp(days[positions.argmax()])} and onwards")
+        quantities = amounts / self.asset.closes[positions]
+        for day, amount, quantity in zip(self.asset.days[positions].tolist(), amounts.tolist(),
+                                         quantities.tolist()):
+            trade = Trade(day, trade_type, amount)
+            trade.quantity = quantity
+            self.trades.append(trade)
+
+    def get_tax_report(self, dates, method=TaxLedger.Method.FIFO, tax_rate: float = None):
+        """
+        指定した日付ごとの実現損益、含み損益、税額を取得するメソッド。
+
+        取引を古い順に一度だけ台帳に記録し、その途中で各日付の状態を取り出す。
+
+        Parameters
+        ----------
+        dates : list
+            状態を取得する日付のリスト。
+        method : TaxLedger.Method, optional
+            取得価額の計算方法。デフォルトは先入先出法。
+        tax_rate : float, optional
+            売却益にかかる税率。省略した場合は取引ごとのtax_rateを用いる。
+
+        Returns
+        -------
+        pd.DataFrame
+            日付をインデックスとし、保有口数、取得価額、評価額、実現損益の累計、含み損益、税額の累計を列とする表。
+        """
+        days = np.sort(to_days(dates))
+        positions = np.searchsorted(self.asset.days, days, side='right') - 1
+        if len(positions) > 0 and positions.min() < 0:
+            raise ValueError(f"No data available for date: {to_timestamp(days[0])} and before")
+        ledger = TaxLedger(method)
+        trades = sorted(self.trades, key=lambda x: x.day)
+        rows = []
+        index = 0
+        for day, position in zip(days.tolist(), positions.tolist()):
+            while index < len(trades) and trades[index].day <= day:
+                trade = trades[index]
+                price = trade.amount / trade.quantity
+                if trade.trade_type == Trade.Type.BUY:
+                    ledger.buy(trade.quantity, price)
+                elif trade.trade_type == Trade.Type.SELL:
+                    rate = trade.tax_rate if tax_rate is None else tax_rate
+                    ledger.sell(trade.quantity, price, rate, trade.date.year)
+                trade.average_share_price = ledger.cost / ledger.quantity if ledger.quantity > 0 else 0
+                index += 1
+            close = self.asset.closes[position]
+            rows.append((ledger.quantity, ledger.cost, ledger.quantity * close, ledger.realized_gain,
+                         ledger.unrealized_gain(close), ledger.tax))
+        columns = ['shares', 'cost_basis', 'valuation', 'realized_gain', 'unrealized_gain', 'tax']
+        return pd.DataFrame(rows, index=days_to_index(days), columns=columns)
+
+    def clone(self, with_trades: bool = True):
+        """
+        価格データを共有し、取引の記録を複製した投資を作成するメソッド。
+
+        アセットはAsset.cloneで複製し、価格データは書き換えた場合のみ複製する。
+        Tradeは税率などを変更できるため、取引ごとに複製する。
+
+        Parameters
+        ----------
+        with_trades : bool, optional
+            取引の記録を引き継ぐかどうか。デフォルトはTrue。
+
+        Returns
+        -------
+        Investment
+            複製した投資。
+        """
+        investment = Investment(self.asset.clone())
+        if with_trades:
+            investment.trades = [copy.copy(trade) for trade in self.trades]
+        return investment
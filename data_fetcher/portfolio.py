@@ -2,8 +2,15 @@
 ポートフォリオを表すクラスを定義するモジュール。
 """
 
+import copy
+
+import numpy as np
+import pandas as pd
+
 from data_fetcher.investment import Investment, Trade
 from data_fetcher.asset import Asset
+from data_fetcher.day_index import days_to_index, to_day, to_days, to_timestamp
+from data_fetcher.fx import FxMatrix
 
 example_plan = {
     'AAPL': {
@@ -29,12 +36,20 @@ class Portfolio:
         投資のリスト。
     date_range : tuple
         データを取得できる日付の範囲。
+    day_range : tuple
+        データを取得できる日付の範囲を表す日番号。
     principal : int
         投資元本。
     cash_ratio : float
         現金の投資比率。
     cash : int
         現金。
+    contributions : list
+        入金の履歴。日番号と金額のタプルのリスト。
+    target_currency : str
+        評価額を計算する通貨の種類。
+    fx : FxMatrix
+        ポートフォリオ内のすべての通貨の為替レート。
 
     Methods
     -------
@@ -44,13 +59,19 @@ class Portfolio:
         投資計画に基づいて投資を初期化するメソッド。
     get_data()
         ポートフォリオ内のすべての投資のデータを取得するメソッド。
+    get_price_matrix(currency: str = None)
+        すべてのAssetの終値を共通の日付に揃えた価格行列を取得するメソッド。
+    get_data_version()
+        ポートフォリオ内のすべてのAssetのデータのバージョンを取得するメソッド。
     invest_all(date: str, amount: int)
         ポートフォリオ全体に設定した割合で投資するメソッド。
+    invest_schedule(dates: list, amounts)
+        積立計画全体をポートフォリオに設定した割合で一括して投資するメソッド。
     invest_to(ticker: str, date: str, amount: int)
         特定のAssetに投資するメソッド。
     transfer(from_: str, to_: str, date: str, amount: int)
         特定のAssetから特定のAssetに資金を移動するメソッド。
-    get_valuation(date: str)
+    get_valuation(date: str, currency: str = None)
         特定の日付のポートフォリオの評価額を取得するメソッド。
     rebalance(date: str)
         ポートフォリオをリバランスするメソッド。
@@ -58,11 +79,15 @@ class Portfolio:
         特定の日付のポートフォリオの利益を取得するメソッド。
     get_profit_rate(date: str)
         特定の日付のポートフォリオの利益率を取得するメソッド。
+    get_cash_flows(date: str)
+        入金の履歴と特定の日付の評価額からキャッシュフローを取得するメソッド。
     reset()
         ポートフォリオをリセットするメソッド。
+    clone(with_trades: bool = True)
+        価格データを共有し、取引の記録、現金、投資元本を複製したポートフォリオを作成するメソッド。
     """
 
-    def __init__(self, plan: dict):
+    def __init__(self, plan: dict, target_currency: str = 'JPY'):
         """
         Portfolioクラスの初期化メソッド。
 
@@ -70,15 +95,22 @@ class Portfolio:
         ----------
         plan : dict
             投資計画を表す辞書。銘柄をキーとし、その銘柄に対する投資比率とアセットタイプを値とする。
+        target_currency : str, optional
+            評価額を計算する通貨の種類。デフォルトは'JPY'。
         """
         if not self.check_total_ratio(plan):
             raise ValueError('Total ratio of investments must be 1')
         self.plan = plan
         self.investments = []
         self.date_range = None
+        self.day_range = None
         self.principal = 0
         self.cash_ratio = 0
         self.cash = 0
+        self.contributions = []
+        self.target_currency = target_currency
+        self.fx = FxMatrix()
+        self.__price_matrices = {}
         self.init_investments()
         self.get_data()
 
@@ -111,7 +143,7 @@ class Portfolio:
             if ticker == 'CASH':
                 self.cash_ratio = self.plan[ticker]['ratio']
                 continue
-            asset = Asset(Asset.Type[self.plan[ticker]['type']], ticker)
+            asset = Asset(Asset.Type[self.plan[ticker]['type']], ticker, self.target_currency)
             investment = Investment(asset)
             self.investments.append(investment)
 
@@ -126,31 +158,95 @@ class Portfolio:
             else:
                 self.date_range = (max(self.date_range[0], investment.asset.date_range[0]),
                                    min(self.date_range[1], investment.asset.date_range[1]))
+        start_date = self.date_range[0].strftime('%Y-%m-%d')
+        end_date = self.date_range[1].strftime('%Y-%m-%d')
         for investment in self.investments:
-            investment.asset.fetch_data(self.date_range[0].strftime('%Y-%m-%d'),
-                                        self.date_range[1].strftime('%Y-%m-%d'))
-            investment.asset.convert_to_target_currency()
+            investment.asset.fetch_data(start_date, end_date)
+        # 為替レートは通貨ごとに対米ドルのレートを1回だけ取得し、各Assetにはクロスレートを渡す
+        currencies = {investment.asset.info['currency'] for investment in self.investments}
+        if currencies != {self.target_currency}:
+            self.fx.fetch(currencies | {self.target_currency}, start_date, end_date)
+        for investment in self.investments:
+            currency = investment.asset.info['currency']
+            if currency != self.target_currency:
+                investment.asset.convert_to_target_currency(self.fx.rate(currency, self.target_currency))
+        self.__price_matrices = {}
 
         # すべてのデータで開始日と終了日が共通か確認する。
-        # 一致しない場合は開始日は後ろにずらし、終了日は前にずらして再取得する。
+        # 取引所ごとにタイムゾーンが異なるため、現地の日付を表す日番号で比較する。
+        # 一致しない場合は開始日は後ろにずらし、終了日は前にずらして取得済みのデータを切り詰める。
         # これを一致するまで続ける。３０回以上繰り返す場合はエラーを出力する。
-        start_dates = [investment.asset.data.index.min() for investment in self.investments]
-        end_dates = [investment.asset.data.index.max() for investment in self.investments]
+        start_days = [investment.asset.days[0] for investment in self.investments]
+        end_days = [investment.asset.days[-1] for investment in self.investments]
         for i in range(30):
-            if len(set(start_dates)) == 1 and len(set(end_dates)) == 1:
+            if len(set(start_days)) == 1 and len(set(end_days)) == 1:
                 break
-            start_date = max(start_dates)
-            end_date = min(end_dates)
+            start_day = max(start_days)
+            end_day = min(end_days)
             for investment in self.investments:
-                investment.asset.fetch_data(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
-                investment.asset.convert_to_target_currency()
-            start_dates = [investment.asset.data.index.min() for investment in self.investments]
-            end_dates = [investment.asset.data.index.max() for investment in self.investments]
+                investment.asset.trim(start_day, end_day)
+                if len(investment.asset.days) == 0:
+                    raise ValueError('Date ranges of assets do not overlap')
+            start_days = [investment.asset.days[0] for investment in self.investments]
+            end_days = [investment.asset.days[-1] for investment in self.investments]
 
-        if len(set(start_dates)) != 1 or len(set(end_dates)) != 1:
+        if len(set(start_days)) != 1 or len(set(end_days)) != 1:
             raise ValueError('Date ranges of assets do not match')
 
-        self.date_range = (start_dates[0], end_dates[0])
+        self.day_range = (int(start_days[0]), int(end_days[0]))
+        index = self.investments[0].asset.data.index
+        self.date_range = (index.min(), index.max())
+
+    def get_price_matrix(self, currency: str = None):
+        """
+        すべてのAssetの終値を共通の日付に揃えた価格行列を取得するメソッド。
+
+        取引所ごとに休日が異なるため、各Assetの現地の日付の日番号で揃え、取引のない日は直前の終値で埋める。
+        通貨ごとの価格行列は一度計算するとキャッシュする。
+
+        Parameters
+        ----------
+        currency : str, optional
+            価格を表す通貨の種類。省略した場合はtarget_currency。
+
+        Returns
+        -------
+        pd.DataFrame
+            日付をインデックス、銘柄を列とする終値の行列。
+        """
+        currency = self.target_currency if currency is None else currency
+        if currency not in self.__price_matrices:
+            if currency == self.target_currency:
+                closes = [pd.Series(investment.asset.closes, index=investment.asset.days,
+                                    name=investment.asset.ticker)
+                          for investment in self.investments]
+                matrix = pd.concat(closes, axis=1, join='outer').sort_index().ffill().dropna()
+                matrix.index = days_to_index(matrix.index)
+            else:
+                # 換算済みの価格行列全体に、日付ごとのクロスレートを一括で掛ける
+                self.__fetch_currency(currency)
+                matrix = self.fx.convert(self.get_price_matrix(), [self.target_currency] * len(self.investments),
+                                         currency)
+            self.__price_matrices[currency] = matrix
+        return self.__price_matrices[currency]
+
+    def __fetch_currency(self, currency: str):
+        """
+        target_currencyと指定した通貨の為替レートを取得するプライベートメソッド。
+        """
+        self.fx.fetch([self.target_currency, currency], self.date_range[0].strftime('%Y-%m-%d'),
+                      self.date_range[1].strftime('%Y-%m-%d'))
+
+    def get_data_version(self):
+        """
+        ポートフォリオ内のすべてのAssetのデータのバージョンを取得するメソッド。
+
+        Returns
+        -------
+        dict
+            銘柄をキー、データのバージョンを値とする辞書。
+        """
+        return {investment.asset.ticker: investment.asset.get_data_version() for investment in self.investments}
 
     def invest_all(self, date: str, amount: int):
         """
@@ -168,6 +264,30 @@ class Portfolio:
         if self.cash_ratio > 0:
             self.cash += amount * self.cash_ratio
         self.principal += amount
+        self.contributions.append((to_day(date), amount))
+
+    def invest_schedule(self, dates, amounts):
+        """
+        積立計画全体をポートフォリオに設定した割合で一括して投資するメソッド。
+
+        invest_allを日付ごとに呼び出すのと同じ結果になるが、投資ごとに配列で一括して記録する。
+
+        Parameters
+        ----------
+        dates : list
+            投資を行う日付のリスト。
+        amounts : int or list
+            投資する金額。日付ごとに指定することもできる（ボーナス月の増額など）。
+        """
+        days = to_days(dates)
+        amounts = np.broadcast_to(np.asarray(amounts, dtype=float), days.shape)
+        for investment in self.investments:
+            investment.record_trades(days, Trade.Type.BUY, amounts * self.plan[investment.asset.ticker]['ratio'])
+        total = amounts.sum()
+        if self.cash_ratio > 0:
+            self.cash += total * self.cash_ratio
+        self.principal += total
+        self.contributions.extend(zip(days.tolist(), amounts.tolist()))
 
     def invest_to(self, ticker: str, date: str, amount: int):
         """
@@ -185,11 +305,13 @@ class Portfolio:
         if ticker == 'CASH':
             self.cash += amount
             self.principal += amount
+            self.contributions.append((to_day(date), amount))
             return
         for investment in self.investments:
             if investment.asset.ticker == ticker:
                 investment.record_trade(date, Trade.Type.BUY, amount)
                 self.principal += amount
+                self.contributions.append((to_day(date), amount))
                 return
         raise ValueError(f'Investment not found for asset: {ticker}')
 
@@ -218,7 +340,7 @@ class Portfolio:
         if to_ == 'CASH':
             self.cash += amount
 
-    def get_valuation(self, date: str):
+    def get_valuation(self, date: str, currency: str = None):
         """
         特定の日付のポートフォリオの評価額を取得するメソッド。
 
@@ -226,6 +348,8 @@ class Portfolio:
         ----------
         date : str
             評価額を取得する日付。
+        currency : str, optional
+            評価額を表す通貨の種類。省略した場合はtarget_currency。
 
         Returns
         -------
@@ -236,6 +360,10 @@ class Portfolio:
         for investment in self.investments:
             average_share_price, shares, principal, asset_valuation = investment.get_state_at(date)
             valuation += asset_valuation
+        if currency is not None and currency != self.target_currency:
+            self.__fetch_currency(currency)
+            rate = self.fx.rate(self.target_currency, currency)
+            valuation *= rate.asof(to_timestamp(to_day(date)))
         return valuation
 
     def rebalance(self, date: str):
@@ -290,11 +418,63 @@ class Portfolio:
         """
         return self.get_profit(date) / self.principal
 
+    def get_cash_flows(self, date: str):
+        """
+        入金の履歴と特定の日付の評価額からキャッシュフローを取得するメソッド。
+        金額加重収益率（XIRR）の計算に用いる。
+
+        Parameters
+        ----------
+        date : str
+            評価額を取得する日付。
+
+        Returns
+        -------
+        tuple
+            日番号の配列と、キャッシュフローの配列（入金を負、評価額を正とする）。
+        """
+        days = np.array([day for day, _ in self.contributions] + [to_day(date)], dtype=np.int64)
+        flows = np.array([-amount for _, amount in self.contributions] + [self.get_valuation(date)], dtype=float)
+        return days, flows
+
     def reset(self):
         """
         ポートフォリオをリセットするメソッド。
         """
         self.principal = 0
         self.cash = 0
+        self.contributions = []
         for investment in self.investments:
             investment.trades = []
+
+    def clone(self, with_trades: bool = True):
+        """
+        価格データを共有し、取引の記録、現金、投資元本を複製したポートフォリオを作成するメソッド。
+
+        Assetの価格データと日番号、為替レート、計算済みの価格行列は複製元と共有し、書き換えた場合のみ
+        複製する（Asset.clone、FxMatrix.clone）。価格行列のキャッシュの辞書は複製ごとに持つため、
+        データの再取得は行わず、複製のメモリ使用量は取引の数にほぼ比例する。
+        複製はスレッドやフォークしたプロセスで独立したシミュレーションに用いることができる。
+
+        Parameters
+        ----------
+        with_trades : bool, optional
+            取引の記録、現金、投資元本を引き継ぐかどうか。Falseの場合は空のポートフォリオとなる。
+            デフォルトはTrue。
+
+        Returns
+        -------
+        Portfolio
+            複製したポートフォリオ。
+        """
+        portfolio = copy.copy(self)
+        portfolio.investments = [investment.clone(with_trades) for investment in self.investments]
+        portfolio.fx = self.fx.clone()
+        portfolio.__price_matrices = dict(self.__price_matrices)
+        if with_trades:
+            portfolio.contributions = list(self.contributions)
+        else:
+            portfolio.principal = 0
+            portfolio.cash = 0
+            portfolio.contributions = []
+        return portfolio
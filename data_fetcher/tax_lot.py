@@ -0,0 +1,245 @@
+"""
+取得単位（ロット）ごとの取得価額を管理し、売却時の実現損益と税額を計算するモジュール。
+
+先入先出法（FIFO）と総平均法に対応する。ロットはNumPy配列のキューで保持し、
+売却時は先頭のロットから順に消費するため、1回の売買あたりの計算量は償却O(1)となる。
+"""
+
+from enum import Enum
+
+import numpy as np
+
+
+class LotQueue:
+    """
+    ロットの数量と1口あたりの取得価額を保持するキューを表すクラス。
+
+    Attributes
+    ----------
+    quantities : np.ndarray
+        ロットごとの数量。
+    prices : np.ndarray
+        ロットごとの1口あたりの取得価額。
+    head : int
+        先頭のロットの位置。
+    tail : int
+        末尾のロットの次の位置。
+    total_quantity : float
+        保有している数量の合計。
+    total_cost : float
+        保有しているロットの取得価額の合計。
+
+    Methods
+    -------
+    push(quantity: float, price: float)
+        ロットを末尾に追加するメソッド。
+    consume(quantity: float)
+        先頭のロットから指定した数量を取り出し、その取得価額を返すメソッド。
+    """
+
+    def __init__(self, capacity: int = 16):
+        """
+        LotQueueクラスの初期化メソッド。
+
+        Parameters
+        ----------
+        capacity : int, optional
+            最初に確保するロットの数。デフォルトは16。
+        """
+        self.quantities = np.empty(capacity)
+        self.prices = np.empty(capacity)
+        self.head = 0
+        self.tail = 0
+        self.total_quantity = 0.0
+        self.total_cost = 0.0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def push(self, quantity: float, price: float):
+        """
+        ロットを末尾に追加するメソッド。
+
+        Parameters
+        ----------
+        quantity : float
+            購入した数量。
+        price : float
+            1口あたりの取得価額。
+        """
+        if self.tail == len(self.quantities):
+            # 消費済みの領域を詰め、足りなければ容量を2倍にする
+            size = len(self)
+            capacity = len(self.quantities) * 2 if size * 2 > len(self.quantities) else len(self.quantities)
+            quantities = np.empty(capacity)
+            prices = np.empty(capacity)
+            quantities[:size] = self.quantities[self.head:self.tail]
+            prices[:size] = self.prices[self.head:self.tail]
+            self.quantities, self.prices = quantities, prices
+            self.head, self.tail = 0, size
+        self.quantities[self.tail] = quantity
+        self.prices[self.tail] = price
+        self.tail += 1
+        self.total_quantity += quantity
+        self.total_cost += quantity * price
+
+    def consume(self, quantity: float):
+        """
+        先頭のロットから指定した数量を取り出し、その取得価額を返すメソッド。
+
+        Parameters
+        ----------
+        quantity : float
+            売却する数量。保有数量を超える場合は保有数量まで取り出す。
+
+        Returns
+        -------
+        float
+            取り出したロットの取得価額の合計。
+        """
+        cost = 0.0
+        consumed = 0.0
+        while quantity > consumed and self.head < self.tail:
+            lot = self.quantities[self.head]
+            taken = min(lot, quantity - consumed)
+            cost += taken * self.prices[self.head]
+            consumed += taken
+            if taken == lot:
+                self.head += 1
+            else:
+                self.quantities[self.head] = lot - taken
+        if self.head == self.tail:
+            self.total_quantity = 0.0
+            self.total_cost = 0.0
+        else:
+            self.total_quantity -= consumed
+            self.total_cost -= cost
+        return cost
+
+
+class TaxLedger:
+    """
+    売買を記録し、実現損益、含み損益、税額を計算する台帳を表すクラス。
+
+    税額は暦年ごとに実現損益を通算して計算する（損失の繰越控除は考慮しない）。
+
+    Attributes
+    ----------
+    method : Method
+        取得価額の計算方法（先入先出法または総平均法）。
+    lots : LotQueue
+        先入先出法で用いるロットのキュー。
+    quantity : float
+        保有数量。
+    cost : float
+        保有数量の取得価額の合計。
+    realized_gain : float
+        実現損益の累計。
+    tax : float
+        税額の累計。
+
+    Methods
+    -------
+    buy(quantity: float, price: float)
+        購入を記録するメソッド。
+    sell(quantity: float, price: float, tax_rate: float, year: int = None)
+        売却を記録し、実現損益を返すメソッド。
+    unrealized_gain(price: float)
+        含み損益を取得するメソッド。
+    """
+    class Method(Enum):
+        """
+        取得価額の計算方法を表すEnumクラス。
+        """
+        FIFO = 'fifo'
+        AVERAGE = 'average'
+
+    def __init__(self, method: Method = Method.FIFO):
+        """
+        TaxLedgerクラスの初期化メソッド。
+
+        Parameters
+        ----------
+        method : Method, optional
+            取得価額の計算方法。デフォルトは先入先出法。
+        """
+        self.method = TaxLedger.Method(method)
+        self.lots = LotQueue()
+        self.quantity = 0.0
+        self.cost = 0.0
+        self.realized_gain = 0.0
+        self.tax = 0.0
+        self.__year = None
+        self.__year_tax = 0.0
+
+    def buy(self, quantity: float, price: float):
+        """
+        購入を記録するメソッド。
+
+        Parameters
+        ----------
+        quantity : float
+            購入した数量。
+        price : float
+            1口あたりの購入価格。
+        """
+        if self.method == TaxLedger.Method.FIFO:
+            self.lots.push(quantity, price)
+        self.quantity += quantity
+        self.cost += quantity * price
+
+    def sell(self, quantity: float, price: float, tax_rate: float, year: int = None):
+        """
+        売却を記録し、実現損益を返すメソッド。
+
+        Parameters
+        ----------
+        quantity : float
+            売却する数量。保有数量を超える場合は保有数量まで売却する。
+        price : float
+            1口あたりの売却価格。
+        tax_rate : float
+            売却益にかかる税率。
+        year : int, optional
+            売却した年。損益通算の単位となる。
+
+        Returns
+        -------
+        float
+            実現損益。
+        """
+        quantity = min(quantity, self.quantity)
+        if quantity <= 0:
+            return 0.0
+        if self.method == TaxLedger.Method.FIFO:
+            cost = self.lots.consume(quantity)
+        else:
+            cost = self.cost * quantity / self.quantity
+        self.quantity -= quantity
+        self.cost = max(self.cost - cost, 0.0) if self.quantity > 0 else 0.0
+        gain = quantity * price - cost
+        self.realized_gain += gain
+        # 同じ年の損益を通算し、年間の税額が負にならないようにする
+        if year != self.__year:
+            self.__year = year
+            self.__year_tax = 0.0
+        previous = max(self.__year_tax, 0.0)
+        self.__year_tax += gain * tax_rate
+        self.tax += max(self.__year_tax, 0.0) - previous
+        return gain
+
+    def unrealized_gain(self, price: float):
+        """
+        含み損益を取得するメソッド。
+
+        Parameters
+        ----------
+        price : float
+            1口あたりの時価。
+
+        Returns
+        -------
+        float
+            含み損益。
+        """
+        return self.quantity * price - self.cost
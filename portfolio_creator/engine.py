@@ -0,0 +1,676 @@
+"""
+価格の配列に対して積立・リバランスを一括で評価するシミュレーションエンジンを定義するモジュール。
+
+Portfolio.invest_allとPortfolio.rebalanceと同じ規則で、複数のパスをNumPy配列のまま評価する。
+過去データのバックテストとブートストラップで生成したシナリオの両方に用いる。
+長期間・多数のパスはChunkedSimulatorでメモリ予算内のチャンクに分けて評価する。
+"""
+
+import numpy as np
+
+from data_fetcher.day_index import to_days
+from portfolio_creator.risk_metrics import DrawdownTracker, RiskMetrics
+from portfolio_creator.xirr import dca_cash_flows, xirr
+
+
+class SimulationState:
+    """
+    シミュレーションの途中状態を表すクラス。
+
+    Attributes
+    ----------
+    shares : np.ndarray
+        パスごと、アセットごとの保有口数。形状は(パス数, アセット数)。
+    cash : np.ndarray
+        パスごとの現金。
+    principal : np.ndarray
+        パスごとの投資元本。
+    cost_basis : np.ndarray
+        パスごと、アセットごとの保有口数の取得価額（総平均法）。
+    realized_gain : np.ndarray
+        パスごとの実現損益の累計。
+    tax_paid : np.ndarray
+        パスごとの税額の累計。還付を差し引いた額。
+    step : np.ndarray
+        パスごとの経過時点数。損益通算の年を求めるために用いる。
+    year : np.ndarray
+        パスごとの最後にリバランスした年（期間の初めからの年数）。
+    year_gain : np.ndarray
+        パスごとのその年の実現損益の累計。
+    year_tax : np.ndarray
+        パスごとのその年の税額の累計。
+
+    Methods
+    -------
+    unrealized_gain(prices: np.ndarray)
+        パスごとの含み損益を取得するメソッド。
+    copy()
+        状態を複製するメソッド。
+    liquidation_tax(prices: np.ndarray, tax_rate: float, year: int)
+        指定した年にすべて売却した場合に追加で支払う税額を取得するメソッド。
+    """
+
+    def __init__(self, n_paths: int, n_assets: int):
+        """
+        SimulationStateクラスの初期化メソッド。
+
+        Parameters
+        ----------
+        n_paths : int
+            パスの数。
+        n_assets : int
+            アセットの数。
+        """
+        self.shares = np.zeros((n_paths, n_assets))
+        self.cash = np.zeros(n_paths)
+        self.principal = np.zeros(n_paths)
+        self.cost_basis = np.zeros((n_paths, n_assets))
+        self.realized_gain = np.zeros(n_paths)
+        self.tax_paid = np.zeros(n_paths)
+        self.step = np.zeros(n_paths, dtype=np.int64)
+        self.year = np.zeros(n_paths, dtype=np.int64)
+        self.year_gain = np.zeros(n_paths)
+        self.year_tax = np.zeros(n_paths)
+
+    def unrealized_gain(self, prices):
+        """
+        パスごとの含み損益を取得するメソッド。
+
+        Parameters
+        ----------
+        prices : np.ndarray
+            アセットの時価。形状は(パス数, アセット数)。
+
+        Returns
+        -------
+        np.ndarray
+            パスごとの含み損益。
+        """
+        return (self.shares * prices - self.cost_basis).sum(axis=1)
+
+    def copy(self):
+        """
+        状態を複製するメソッド。
+
+        Returns
+        -------
+        SimulationState
+            すべての配列を複製した状態。
+        """
+        state = SimulationState(0, 0)
+        for name, value in vars(self).items():
+            setattr(state, name, value.copy())
+        return state
+
+    def liquidation_tax(self, prices, tax_rate: float, year):
+        """
+        指定した年にすべて売却した場合に追加で支払う税額を取得するメソッド。
+
+        Parameters
+        ----------
+        prices : np.ndarray
+            アセットの時価。形状は(パス数, アセット数)。
+        tax_rate : float
+            売却益にかかる税率。
+        year : int or np.ndarray
+            売却する年（期間の初めからの年数）。
+
+        Returns
+        -------
+        np.ndarray
+            パスごとの追加の税額。同じ年の売却損と通算するため負（還付）になることがある。
+        """
+        same_year = self.year == year
+        year_gain = np.where(same_year, self.year_gain, 0.0)
+        year_tax = np.where(same_year, self.year_tax, 0.0)
+        return np.maximum(year_gain + self.unrealized_gain(prices), 0.0) * tax_rate - year_tax
+
+
+def schedule_to_steps(index, dates, amounts):
+    """
+    積立の日付と金額を、価格の時系列の各時点での積立額の配列に変換する関数。
+
+    Portfolio.invest_allと同様に、取引日でない日付は次の取引日に積み立てる。
+    日付は日番号に変換して比較するため、タイムゾーン付きの日付とタイムゾーンなしの日付のどちらも渡せる。
+
+    Parameters
+    ----------
+    index : pd.DatetimeIndex
+        価格の時系列のインデックス。日番号の配列を渡すこともできる。
+    dates : list
+        積立の日付のリスト。日番号のリストを渡すこともできる。
+    amounts : float or list
+        積立額。日付ごとに指定することもできる。
+
+    Returns
+    -------
+    np.ndarray
+        各時点での積立額。期間外の日付は無視する。
+    """
+    index_days = to_days(index)
+    steps = np.searchsorted(index_days, to_days(dates), side='left')
+    amounts = np.broadcast_to(np.asarray(amounts, dtype=float), steps.shape)
+    valid = steps < len(index_days)
+    return np.bincount(steps[valid], weights=amounts[valid], minlength=len(index_days)).astype(float)
+
+
+def _rebalance_after_tax(total, shares, cost_basis, price, weights, tax_rate: float, year_gain, year_tax,
+                         tol: float = 1e-12, max_iter: int = 100):
+    """
+    リバランスで支払う税額と、税引き後の評価額で設定比率に戻した保有口数を求めるプライベート関数。
+
+    税額はその年の実現損益の累計に対する税額からその年に支払い済みの税額を引いたものとし、
+    同じ年の売却損と通算して負（還付）になることがある。税額を支払うと売却する口数が変わるため、
+    税引き後の評価額Tについて T + 税額(T) - 評価額 = 0 を解く。左辺はTについて狭義単調増加の
+    区分線形関数なので、解を挟む区間を保ったニュートン法で求める。
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 総平均法での売却額に対する売却益の割合
+        gain_ratio = np.where(shares > 0, 1 - cost_basis / (shares * price), 0.0)
+    max_gain = (shares * price * np.maximum(gain_ratio, 0.0)).sum(axis=1)
+    lower = total + year_tax - np.maximum(year_gain + max_gain, 0.0) * tax_rate
+    upper = total + year_tax
+    after_tax = np.clip(total, lower, upper)
+
+    def residual(after_tax):
+        target = after_tax[:, None] * weights / price
+        sold = shares > target
+        gain = (np.where(sold, shares - target, 0.0) * price * gain_ratio).sum(axis=1)
+        taxed = year_gain + gain > 0
+        tax = np.where(taxed, year_gain + gain, 0.0) * tax_rate - year_tax
+        slope = 1 - np.where(taxed, (np.where(sold, weights, 0.0) * gain_ratio).sum(axis=1), 0.0) * tax_rate
+        return after_tax + tax - total, slope, tax, gain, target
+
+    for _ in range(max_iter):
+        value, slope, tax, gain, target = residual(after_tax)
+        converged = np.abs(value) <= tol * np.maximum(np.abs(total), 1.0)
+        if converged.all():
+            break
+        lower = np.where(value < 0, after_tax, lower)
+        upper = np.where(value > 0, after_tax, upper)
+        newton = after_tax - value / slope
+        candidate = np.where((newton > lower) & (newton < upper), newton, (lower + upper) / 2)
+        after_tax = np.where(converged, after_tax, candidate)
+    _, _, tax, gain, target = residual(after_tax)
+    return total - tax, tax, gain, target
+
+
+def _rebalance(state: SimulationState, total, price, weights, cash_ratio: float, tax_rate: float, year):
+    """
+    税引き後の評価額で設定比率に戻し、状態を更新するプライベート関数。
+
+    run_dcaとfind_band_rebalancesで同じ規則のリバランスを行うために用いる。
+
+    Returns
+    -------
+    np.ndarray
+        リバランス後の評価額。
+    """
+    # 年が変わった場合はその年の実現損益と税額を0から数え直す
+    new_year = state.year != year
+    state.year = np.broadcast_to(year, state.year.shape).astype(np.int64)
+    state.year_gain = np.where(new_year, 0.0, state.year_gain)
+    state.year_tax = np.where(new_year, 0.0, state.year_tax)
+    total, tax, gain, target = _rebalance_after_tax(total, state.shares, state.cost_basis, price, weights, tax_rate,
+                                                    state.year_gain, state.year_tax)
+    state.realized_gain = state.realized_gain + gain
+    state.tax_paid = state.tax_paid + tax
+    state.year_gain = state.year_gain + gain
+    state.year_tax = state.year_tax + tax
+    # 実現損益を計算した売却と同じ口数で取得価額を減らし、購入した分を加える
+    sold = np.maximum(state.shares - target, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sold_ratio = np.where(state.shares > 0, sold / state.shares, 0.0)
+    state.cost_basis = state.cost_basis * (1 - sold_ratio) + np.maximum(target - state.shares, 0.0) * price
+    state.shares = target
+    state.cash = total * cash_ratio
+    return total
+
+
+def run_dca(prices, weights, cash_ratio: float, contributions, rebalance=None, state: SimulationState = None,
+            tax_rate: float = 0.0, steps_per_year: float = 252):
+    """
+    積立とリバランスを行った場合の評価額の推移を計算する関数。
+
+    各時点の積立はその時点の終値で設定比率どおりに購入し、リバランスは積立の後に行う。
+    リバランスの間は保有口数の累積和で表せるため、時間方向のループはリバランスの回数だけで済む。
+    取得価額は総平均法で管理し、tax_rateを指定するとリバランスの売却益に課税して、税引き後の評価額を
+    設定比率に戻す。税額を支払うための売却分も含めた売却益に課税するため、期間の終わりの評価額と
+    投資元本の差は、実現損益と含み損益の合計から税額を引いたものに一致する。
+
+    損益通算はTaxLedgerと同じく年単位で行い、同じ年の売却損で納税済みの税額が還付される。
+    年は期間の初めからの時点数をsteps_per_yearで割って求める。先入先出法には対応していない（総平均法のみ）。
+
+    Parameters
+    ----------
+    prices : np.ndarray
+        アセットの価格。形状は(パス数, 時点数, アセット数)。
+    weights : np.ndarray
+        アセットごとの投資比率。
+    cash_ratio : float
+        現金の投資比率。
+    contributions : np.ndarray
+        各時点での積立額。形状は(時点数,)。
+    rebalance : np.ndarray, optional
+        各時点でリバランスを行うかどうかを表す真偽値の配列。形状は(時点数,)。
+    state : SimulationState, optional
+        前の期間から引き継ぐ状態。省略した場合は空のポートフォリオから始める。
+        渡した場合は期間の終わりの状態に更新される。
+    tax_rate : float, optional
+        売却益にかかる税率。デフォルトは0（非課税口座）。
+    steps_per_year : float, optional
+        1年あたりの時点数。損益通算の年を求めるために用いる。デフォルトは252（営業日）。
+
+    Returns
+    -------
+    tuple
+        評価額の推移（パス数, 時点数）、投資元本の推移（パス数, 時点数）、期間の終わりの状態。
+    """
+    prices = np.asarray(prices, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    contributions = np.asarray(contributions, dtype=float)
+    n_paths, n_steps, n_assets = prices.shape
+    if state is None:
+        state = SimulationState(n_paths, n_assets)
+    rebalance_steps = np.flatnonzero(rebalance) if rebalance is not None else np.array([], dtype=int)
+
+    valuations = np.empty((n_paths, n_steps))
+    principals = state.principal[:, None] + np.cumsum(contributions)[None, :]
+    bounds = np.concatenate([[0], rebalance_steps + 1, [n_steps]])
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if start >= end:
+            continue
+        segment = prices[:, start:end]
+        bought = contributions[None, start:end, None] * weights / segment
+        shares = state.shares[:, None, :] + np.cumsum(bought, axis=1)
+        cash = state.cash[:, None] + np.cumsum(contributions[start:end]) * cash_ratio
+        valuations[:, start:end] = np.einsum('ptk,ptk->pt', shares, segment) + cash
+        state.shares = shares[:, -1]
+        state.cash = cash[:, -1]
+        state.cost_basis = state.cost_basis + contributions[start:end].sum() * weights
+        if end - 1 in rebalance_steps:
+            year = ((state.step + end - 1) // steps_per_year).astype(np.int64)
+            valuations[:, end - 1] = _rebalance(state, valuations[:, end - 1], segment[:, -1], weights, cash_ratio,
+                                                tax_rate, year)
+    state.principal = principals[:, -1] if n_steps > 0 else state.principal
+    state.step = state.step + n_steps
+    return valuations, principals, state
+
+
+def unit_values(valuations, contributions, previous_valuation, previous_unit_value):
+    """
+    評価額の推移から積立の影響を除いた基準価額（時間加重）の推移を計算する関数。
+
+    各時点の基準価額は、その時点の積立を除いた評価額の前の時点の評価額に対する比率で変化する。
+    評価額そのものは積立で増えるため、ドローダウンはこの基準価額で測る。
+
+    Parameters
+    ----------
+    valuations : np.ndarray
+        評価額の推移。形状は(パス数, 時点数)。
+    contributions : np.ndarray
+        各時点での積立額。形状は(時点数,)。
+    previous_valuation : np.ndarray
+        パスごとの直前の時点の評価額。最初のチャンクでは0とする。
+    previous_unit_value : np.ndarray
+        パスごとの直前の時点の基準価額。最初のチャンクでは1とする。
+
+    Returns
+    -------
+    np.ndarray
+        基準価額の推移。形状は(パス数, 時点数)。評価額が0の間は基準価額を変えない。
+    """
+    before = np.concatenate([previous_valuation[:, None], valuations[:, :-1]], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.where(before > 0, (valuations - contributions[None, :]) / before, 1.0)
+    return previous_unit_value[:, None] * np.cumprod(growth, axis=1)
+
+
+class ChunkedSimulator:
+    """
+    パスと時間をメモリ予算内のチャンクに分けてシミュレーションを行うクラス。
+
+    時間方向のチャンクの間では保有口数、現金、投資元本、価格の水準、直前の評価額と基準価額、
+    基準価額の最大値のみを引き継ぎ、評価額の推移全体は保持しない。ピークメモリはパス数と期間の長さではなくmemory_budgetで決まる。
+
+    Attributes
+    ----------
+    bootstrap : BlockBootstrap
+        リターンを生成するシナリオ生成器。
+    weights : np.ndarray
+        アセットごとの投資比率。
+    cash_ratio : float
+        現金の投資比率。
+    contributions : np.ndarray
+        各時点での積立額。長さが期間の長さとなる。
+    rebalance : np.ndarray
+        各時点でリバランスを行うかどうかを表す真偽値の配列。
+    memory_budget : int
+        1つのチャンクで使用するメモリの上限（バイト）。
+    tax_rate : float
+        売却益にかかる税率。
+    steps_per_year : float
+        1年あたりの時点数。金額加重収益率の年率換算と損益通算の年に用いる。
+
+    Methods
+    -------
+    chunk_shape(n_paths: int)
+        1つのチャンクのパス数と時点数を取得するメソッド。
+    run(n_paths: int, seed: int = None)
+        パスのチャンクごとに結果を生成するジェネレータメソッド。
+    summarize(n_paths: int, seed: int = None, metrics: RiskMetrics = None)
+        すべてのパスのリスク統計量を集計するメソッド。
+    """
+    # 1つの時点、パス、アセットあたりに同時に確保する配列の数の目安
+    ARRAYS_PER_CELL = 6
+
+    def __init__(self, bootstrap, weights, cash_ratio: float, contributions, rebalance=None,
+                 memory_budget: int = 256 * 2 ** 20, tax_rate: float = 0.0, steps_per_year: float = 252):
+        """
+        ChunkedSimulatorクラスの初期化メソッド。
+
+        Parameters
+        ----------
+        bootstrap : BlockBootstrap
+            リターンを生成するシナリオ生成器。
+        weights : np.ndarray
+            アセットごとの投資比率。
+        cash_ratio : float
+            現金の投資比率。
+        contributions : np.ndarray
+            各時点での積立額。長さが期間の長さとなり、1以上である必要がある。
+        rebalance : np.ndarray, optional
+            各時点でリバランスを行うかどうかを表す真偽値の配列。
+        memory_budget : int, optional
+            1つのチャンクで使用するメモリの上限（バイト）。デフォルトは256MiB。
+        tax_rate : float, optional
+            売却益にかかる税率。デフォルトは0（非課税口座）。
+        steps_per_year : float, optional
+            1年あたりの時点数。デフォルトは252（営業日）。
+        """
+        if len(contributions) == 0:
+            raise ValueError('contributions must have at least one step')
+        self.bootstrap = bootstrap
+        self.weights = np.asarray(weights, dtype=float)
+        self.cash_ratio = cash_ratio
+        self.contributions = np.asarray(contributions, dtype=float)
+        self.rebalance = np.zeros(len(self.contributions), dtype=bool) if rebalance is None \
+            else np.asarray(rebalance, dtype=bool)
+        self.memory_budget = memory_budget
+        self.tax_rate = tax_rate
+        self.steps_per_year = steps_per_year
+
+    def chunk_shape(self, n_paths: int):
+        """
+        1つのチャンクのパス数と時点数を取得するメソッド。
+
+        期間全体が予算に収まる場合はパス方向のみを分割し、収まらない場合は時間方向も
+        ブロックの長さの倍数で分割する。
+
+        Parameters
+        ----------
+        n_paths : int
+            パスの総数。
+
+        Returns
+        -------
+        tuple
+            1つのチャンクのパス数と時点数。
+        """
+        horizon = len(self.contributions)
+        n_assets = len(self.weights)
+        bytes_per_step = 8 * (self.ARRAYS_PER_CELL * n_assets + 4)
+        block = self.bootstrap.block_length
+        paths = min(n_paths, max(1, self.memory_budget // (bytes_per_step * horizon)))
+        if paths >= min(n_paths, 256):
+            return paths, horizon
+        # 期間全体ではパス数が少なすぎる場合は、時間方向に分割してパス方向のベクトル化を保つ
+        paths = min(n_paths, 256)
+        steps = self.memory_budget // (bytes_per_step * paths) // block * block
+        if steps < block:
+            steps = block
+            paths = max(1, min(paths, self.memory_budget // (bytes_per_step * block)))
+        return paths, min(steps, horizon)
+
+    def run(self, n_paths: int, seed: int = None):
+        """
+        パスのチャンクごとに結果を生成するジェネレータメソッド。
+
+        Parameters
+        ----------
+        n_paths : int
+            パスの総数。
+        seed : int, optional
+            乱数のシード。同じシードであればチャンクの分け方によらず同じ結果になる。
+
+        Yields
+        ------
+        dict
+            チャンク内のパスごとの最終評価額、投資元本、リターン（投資元本が0の場合はNaN）、
+            年率の金額加重収益率、基準価額の最大ドローダウン、すべて売却した場合の税引き後の評価額、
+            リバランスで支払った税額の累計。
+        """
+        horizon = len(self.contributions)
+        n_assets = len(self.weights)
+        chunk_paths, chunk_steps = self.chunk_shape(n_paths)
+        contribution_steps = np.flatnonzero(self.contributions)
+        rng = np.random.default_rng(seed)
+        for path_start in range(0, n_paths, chunk_paths):
+            paths = min(chunk_paths, n_paths - path_start)
+            # ブロックの開始位置は期間全体分を先に生成し、時間方向のチャンクでは取り出すだけにする
+            starts = self.bootstrap.sample_block_starts(paths, horizon, rng)
+            state = SimulationState(paths, n_assets)
+            tracker = DrawdownTracker(paths)
+            log_level = np.zeros((paths, n_assets))
+            last_valuation = np.zeros(paths)
+            last_unit_value = np.ones(paths)
+            for start in range(0, horizon, chunk_steps):
+                end = min(start + chunk_steps, horizon)
+                log_returns = self.bootstrap.gather(starts, start, end)
+                if start == 0:
+                    # 最初の時点は初期価格とする
+                    log_returns[:, 0] = 0.0
+                cumulative = log_level[:, None, :] + np.cumsum(log_returns, axis=1)
+                log_level = cumulative[:, -1]
+                prices = self.bootstrap.initial_prices * np.exp(cumulative)
+                del log_returns, cumulative
+                valuations, _, state = run_dca(prices, self.weights, self.cash_ratio,
+                                               self.contributions[start:end], self.rebalance[start:end], state,
+                                               self.tax_rate, self.steps_per_year)
+                units = unit_values(valuations, self.contributions[start:end], last_valuation, last_unit_value)
+                tracker.update(units)
+                last_valuation, last_unit_value = valuations[:, -1], units[:, -1]
+                del prices, units
+            final_valuation = valuations[:, -1]
+            # 最終時点ですべて売却した場合の税引き後の評価額
+            final_year = int((horizon - 1) // self.steps_per_year)
+            after_tax_valuation = final_valuation - state.liquidation_tax(
+                self.bootstrap.initial_prices * np.exp(log_level), self.tax_rate, final_year)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                returns = np.where(state.principal > 0, final_valuation / state.principal - 1, np.nan)
+            # 積立の時点と最終時点の評価額から、パスごとの金額加重収益率を求める
+            if contribution_steps.size > 0:
+                cash_flows, times = dca_cash_flows(contribution_steps, self.contributions[contribution_steps],
+                                                   horizon - 1, final_valuation, self.steps_per_year)
+                path_xirr = xirr(cash_flows, times)
+            else:
+                path_xirr = np.full(paths, np.nan)
+            yield {
+                'path_start': path_start,
+                'final_valuation': final_valuation,
+                'principal': state.principal,
+                'return': returns,
+                'xirr': path_xirr,
+                'max_drawdown': tracker.max_drawdown,
+                'after_tax_valuation': after_tax_valuation,
+                'tax_paid': state.tax_paid,
+            }
+
+    def summarize(self, n_paths: int, seed: int = None, metrics: RiskMetrics = None):
+        """
+        すべてのパスのリスク統計量を集計するメソッド。
+
+        Parameters
+        ----------
+        n_paths : int
+            パスの総数。
+        seed : int, optional
+            乱数のシード。
+        metrics : RiskMetrics, optional
+            集計先。省略した場合は新しく作成する。
+
+        Returns
+        -------
+        RiskMetrics
+            リスク統計量の集計結果。
+        """
+        metrics = RiskMetrics() if metrics is None else metrics
+        for result in self.run(n_paths, seed):
+            metrics.update(result['return'], result['max_drawdown'])
+        return metrics
+
+
+def find_band_rebalances(prices, weights, cash_ratio: float, contributions, band: float, relative: bool = False,
+                         window: int = 252, state: SimulationState = None, tax_rate: float = 0.0,
+                         steps_per_year: float = 252):
+    """
+    比率の乖離が許容幅を超えた時点でリバランスする場合の、リバランスの時点を求める関数。
+
+    リバランスの間の保有口数は積立の累積和で表せるため、各時点の比率を一括で計算し、
+    許容幅を最初に超える時点を配列の走査で求める。時間方向のループはリバランスの回数と
+    走査する区間の数だけで済む。リバランス後の保有口数はrun_dcaと同じく税引き後の評価額から求めるため、
+    stateとtax_rateをrun_dcaと揃えれば、判定に用いる比率は評価に用いる比率と一致する。
+
+    Parameters
+    ----------
+    prices : np.ndarray
+        アセットの価格。形状は(時点数, アセット数)。
+    weights : np.ndarray
+        アセットごとの投資比率。
+    cash_ratio : float
+        現金の投資比率。
+    contributions : np.ndarray
+        各時点での積立額。形状は(時点数,)。
+    band : float
+        比率の乖離の許容幅。
+    relative : bool, optional
+        許容幅を設定比率に対する相対値とするかどうか。デフォルトはFalse（比率の差の絶対値）。
+    window : int, optional
+        一度に走査する時点数の初期値。許容幅を超えない場合は倍にして走査を続ける。デフォルトは252。
+    state : SimulationState, optional
+        前の期間から引き継ぐ1つのパスの状態。省略した場合は空のポートフォリオから始める。変更はしない。
+    tax_rate : float, optional
+        売却益にかかる税率。デフォルトは0（非課税口座）。
+    steps_per_year : float, optional
+        1年あたりの時点数。損益通算の年を求めるために用いる。デフォルトは252。
+
+    Returns
+    -------
+    np.ndarray
+        各時点でリバランスを行うかどうかを表す真偽値の配列。形状は(時点数,)。
+    """
+    if window < 1:
+        raise ValueError(f'Invalid window: {window}')
+    prices = np.asarray(prices, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    contributions = np.asarray(contributions, dtype=float)
+    # 現金も1つのアセットとして扱い、価格を1とする
+    targets = np.append(weights, cash_ratio)
+    prices = np.column_stack([prices, np.ones(len(prices))])
+    tracked = targets > 0 if relative else np.ones(len(targets), dtype=bool)
+    n_steps = len(prices)
+    rebalance = np.zeros(n_steps, dtype=bool)
+    # 引き継いだ状態は変更せず、複製した状態でリバランス後の保有口数と取得価額、その年の損益を追う
+    state = SimulationState(1, len(weights)) if state is None else state.copy()
+    first_step = state.step.copy()
+    holdings = np.append(state.shares[0], state.cash[0])
+    cost_basis = state.cost_basis[0].copy()
+    start = 0
+    size = window
+    while start < n_steps:
+        end = min(start + size, n_steps)
+        segment = prices[start:end]
+        units = holdings + np.cumsum(contributions[start:end, None] * targets / segment, axis=0)
+        values = units * segment
+        totals = values.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drift = values / totals[:, None] - targets
+            if relative:
+                drift = drift / targets
+        breached = (np.abs(drift[:, tracked]) > band).any(axis=1) & (totals > 0)
+        if breached.any():
+            step = int(np.argmax(breached))
+            rebalance[start + step] = True
+            # run_dcaと同じく税引き後の評価額で設定比率に戻し、取得価額を更新する
+            state.shares = units[step:step + 1, :-1]
+            state.cost_basis = (cost_basis + contributions[start:start + step + 1].sum() * weights)[None]
+            year = (first_step + start + step) // steps_per_year
+            total = _rebalance(state, totals[step:step + 1], segment[step:step + 1, :-1], weights, cash_ratio,
+                               tax_rate, year.astype(np.int64))
+            cost_basis = state.cost_basis[0]
+            holdings = np.append(state.shares[0], total[0] * cash_ratio)
+            start += step + 1
+            size = window
+        else:
+            holdings = units[-1]
+            cost_basis = cost_basis + contributions[start:end].sum() * weights
+            start = end
+            size *= 2
+    return rebalance
+
+
+def run_drift_band(prices, weights, cash_ratio: float, contributions, band: float, relative: bool = False,
+                   state: SimulationState = None, tax_rate: float = 0.0, steps_per_year: float = 252):
+    """
+    比率の乖離が許容幅を超えた時点でリバランスした場合の評価額の推移を計算する関数。
+
+    パスごとにfind_band_rebalancesでリバランスの時点を求め、run_dcaで評価する。判定には各パスの引き継いだ状態と
+    tax_rateを渡すため、時間方向に分割して呼び出しても一括で呼び出した場合と同じ時点でリバランスする。
+    パス方向はPythonのループとなり、計算時間はパス数とリバランスの回数に比例する。
+    多数のパスでは固定のリバランスの時点を渡すrun_dcaの方が速い。
+
+    Parameters
+    ----------
+    prices : np.ndarray
+        アセットの価格。形状は(パス数, 時点数, アセット数)。
+    weights : np.ndarray
+        アセットごとの投資比率。
+    cash_ratio : float
+        現金の投資比率。
+    contributions : np.ndarray
+        各時点での積立額。形状は(時点数,)。
+    band : float
+        比率の乖離の許容幅。
+    relative : bool, optional
+        許容幅を設定比率に対する相対値とするかどうか。
+    state : SimulationState, optional
+        前の期間から引き継ぐ状態。リバランスの時点の判定にも用いる。
+    tax_rate : float, optional
+        売却益にかかる税率。
+    steps_per_year : float, optional
+        1年あたりの時点数。損益通算の年を求めるために用いる。
+
+    Returns
+    -------
+    tuple
+        評価額の推移（パス数, 時点数）、投資元本の推移（パス数, 時点数）、期間の終わりの状態、
+        リバランスの時点（パス数, 時点数）。
+    """
+    prices = np.asarray(prices, dtype=float)
+    n_paths, n_steps, n_assets = prices.shape
+    state = SimulationState(n_paths, n_assets) if state is None else state
+    valuations = np.empty((n_paths, n_steps))
+    principals = np.empty((n_paths, n_steps))
+    rebalances = np.empty((n_paths, n_steps), dtype=bool)
+    for path in range(n_paths):
+        path_state = SimulationState(1, n_assets)
+        for name in vars(path_state):
+            setattr(path_state, name, getattr(state, name)[path:path + 1])
+        rebalances[path] = find_band_rebalances(prices[path], weights, cash_ratio, contributions, band, relative,
+                                                state=path_state, tax_rate=tax_rate, steps_per_year=steps_per_year)
+        valuations[path:path + 1], principals[path:path + 1], path_state = run_dca(
+            prices[path:path + 1], weights, cash_ratio, contributions, rebalances[path], path_state, tax_rate,
+            steps_per_year)
+        for name in vars(path_state):
+            getattr(state, name)[path:path + 1] = getattr(path_state, name)
+    return valuations, principals, state, rebalances
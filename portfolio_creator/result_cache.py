@@ -0,0 +1,304 @@
+"""
+シミュレーション結果をディスクにキャッシュするモジュール。
+
+投資計画、価格データのバージョン、積立計画、戦略のパラメータ、乱数のシードから計算したハッシュをキーとし、
+同じ条件のシミュレーションを再計算せずに結果を返す。
+価格データに新しい日付のデータが追加されるとバージョンが変わるため、古い結果は自動的に使われなくなる。
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from helper.config import Config
+
+# キャッシュに存在しないことを表す値。Noneを結果として保存した場合と区別するために用いる
+MISSING = object()
+
+
+def _digest(values):
+    """
+    配列の内容のSHA-256を計算するプライベート関数。
+    """
+    return hashlib.sha256(np.ascontiguousarray(values).tobytes()).hexdigest()
+
+
+def _canonical(value):
+    """
+    ハッシュを計算するために値をJSONに変換できる形に正規化するプライベート関数。
+
+    配列とpandasのオブジェクトは文字列表現ではなく内容のハッシュで表し、途中の要素の違いも区別する。
+    対応していない型はTypeErrorとする。
+    """
+    if isinstance(value, dict):
+        return {str(key): _canonical(value[key]) for key in sorted(value, key=str)}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return {'dtype': str(value.dtype), 'shape': list(value.shape), 'sha256': _digest(value)}
+    if isinstance(value, pd.Index):
+        return {'type': type(value).__name__, 'dtype': str(value.dtype), 'names': [str(name) for name in value.names],
+                'sha256': _digest(pd.util.hash_pandas_object(value).to_numpy())}
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        columns = [value.name] if isinstance(value, pd.Series) else list(value.columns)
+        return {'type': type(value).__name__, 'columns': [str(column) for column in columns],
+                'dtypes': [str(dtype) for dtype in np.atleast_1d(value.dtypes)], 'index': _canonical(value.index),
+                'sha256': _digest(pd.util.hash_pandas_object(value, index=True).to_numpy())}
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    raise TypeError(f'Cannot compute cache key for value of type {type(value).__name__}')
+
+
+def make_key(plan: dict, data_version: dict, schedule, params: dict = None, seed: int = None):
+    """
+    シミュレーションの条件からキャッシュのキーを計算する関数。
+
+    Parameters
+    ----------
+    plan : dict
+        投資計画を表す辞書。
+    data_version : dict
+        銘柄ごとの価格データのバージョン。Portfolio.get_data_version()の戻り値を想定する。
+    schedule : object
+        積立計画。日付と金額の配列など。
+    params : dict, optional
+        戦略のパラメータ。
+    seed : int, optional
+        乱数のシード。
+
+    Returns
+    -------
+    str
+        キャッシュのキー（SHA-256の16進数表記）。
+    """
+    payload = _canonical({'plan': plan, 'data_version': data_version, 'schedule': schedule,
+                          'params': params or {}, 'seed': seed})
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    シミュレーション結果のディスクキャッシュを表すクラス。
+
+    エントリは1つのキーにつき1つのファイルとして保存し、最終アクセス日時による
+    LRUで合計サイズとエントリ数が上限を超えないように削除する。
+    価格データのバージョンは結果を読み込まずに確認できるように、同じ名前のJSONファイルに保存する。
+
+    Attributes
+    ----------
+    directory : str
+        キャッシュを保存するディレクトリ。
+    max_bytes : int
+        キャッシュの合計サイズの上限（バイト）。
+    max_entries : int
+        キャッシュのエントリ数の上限。
+
+    Methods
+    -------
+    get(key: str, default=None)
+        キャッシュから結果を取得するメソッド。
+    put(key: str, value, data_version: dict = None)
+        結果をキャッシュに保存するメソッド。
+    get_or_compute(key: str, compute, data_version: dict = None)
+        キャッシュに結果があれば返し、なければ計算して保存するメソッド。
+    invalidate(data_version: dict)
+        価格データのバージョンが古いエントリを削除するメソッド。
+    clear()
+        すべてのエントリを削除するメソッド。
+    """
+    SUFFIX = '.pkl'
+    VERSION_SUFFIX = '.json'
+
+    def __init__(self, directory: str = None, max_bytes: int = 512 * 2 ** 20, max_entries: int = None):
+        """
+        ResultCacheクラスの初期化メソッド。
+
+        Parameters
+        ----------
+        directory : str, optional
+            キャッシュを保存するディレクトリ。省略した場合は設定ファイルのsimulation_cache_dirを用いる。
+        max_bytes : int, optional
+            キャッシュの合計サイズの上限。デフォルトは512MiB。
+        max_entries : int, optional
+            キャッシュのエントリ数の上限。省略した場合は制限しない。
+        """
+        if directory is None:
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            directory = os.path.join(base_dir, Config().config.get('simulation_cache_dir', '.cache/simulation'))
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __path(self, key: str):
+        """
+        キーに対応するファイルのパスを取得するプライベートメソッド。
+        """
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def __version_path(self, path: str):
+        """
+        エントリのファイルのパスから、価格データのバージョンを保存するファイルのパスを取得するプライベートメソッド。
+        """
+        return path[:-len(self.SUFFIX)] + self.VERSION_SUFFIX
+
+    def __remove(self, path: str):
+        """
+        エントリと価格データのバージョンのファイルを削除するプライベートメソッド。
+        """
+        for target in (path, self.__version_path(path)):
+            try:
+                os.remove(target)
+            except FileNotFoundError:
+                pass
+
+    def __write(self, path: str, write, mode: str):
+        """
+        一時ファイルに書いてから置き換えることで、ファイルを原子的に書き込むプライベートメソッド。
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(temp_path, path)
+
+    def __entries(self):
+        """
+        エントリのパス、サイズ、最終アクセス日時を古い順に取得するプライベートメソッド。
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(self.SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def get(self, key: str, default=None):
+        """
+        キャッシュから結果を取得するメソッド。
+
+        Parameters
+        ----------
+        key : str
+            キャッシュのキー。
+        default : object, optional
+            存在しない場合に返す値。Noneを保存した結果と区別する場合はMISSINGを渡す。デフォルトはNone。
+
+        Returns
+        -------
+        object
+            キャッシュされた結果。存在しない場合はdefault。
+        """
+        path = self.__path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return default
+        except (pickle.UnpicklingError, EOFError) as e:
+            print(f"Error occurred while loading cache entry: {e}")
+            self.__remove(path)
+            return default
+        # 最終アクセス日時を更新してLRUの順序に反映する
+        os.utime(path)
+        return value
+
+    def put(self, key: str, value, data_version: dict = None):
+        """
+        結果をキャッシュに保存するメソッド。
+
+        Parameters
+        ----------
+        key : str
+            キャッシュのキー。
+        value : object
+            保存する結果。pickleで保存できる必要がある。
+        data_version : dict, optional
+            結果の計算に用いた価格データのバージョン。invalidate()で用いる。
+        """
+        # 書き込み途中のファイルを読まないように、一時ファイルに書いてから置き換える
+        path = self.__path(key)
+        self.__write(self.__version_path(path), lambda f: json.dump(data_version or {}, f), 'w')
+        self.__write(path, lambda f: pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL), 'wb')
+        self.__evict()
+
+    def get_or_compute(self, key: str, compute, data_version: dict = None):
+        """
+        キャッシュに結果があれば返し、なければ計算して保存するメソッド。
+
+        Parameters
+        ----------
+        key : str
+            キャッシュのキー。
+        compute : callable
+            結果を計算する引数なしの関数。
+        data_version : dict, optional
+            結果の計算に用いた価格データのバージョン。
+
+        Returns
+        -------
+        object
+            シミュレーションの結果。
+        """
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            value = compute()
+            self.put(key, value, data_version)
+        return value
+
+    def invalidate(self, data_version: dict):
+        """
+        価格データのバージョンが古いエントリを削除するメソッド。
+
+        Parameters
+        ----------
+        data_version : dict
+            銘柄ごとの最新の価格データのバージョン。
+
+        Returns
+        -------
+        int
+            削除したエントリの数。
+        """
+        removed = 0
+        for _, _, path in self.__entries():
+            try:
+                with open(self.__version_path(path), 'r') as f:
+                    versions = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                # バージョンが分からないエントリは古いものとみなす
+                versions = None
+            if versions is None or any(ticker in data_version and data_version[ticker] != version
+                                       for ticker, version in versions.items()):
+                self.__remove(path)
+                removed += 1
+        return removed
+
+    def clear(self):
+        """
+        すべてのエントリを削除するメソッド。
+        """
+        for _, _, path in self.__entries():
+            self.__remove(path)
+
+    def __evict(self):
+        """
+        合計サイズとエントリ数が上限を超えないように、最終アクセス日時が古いエントリから削除するプライベートメソッド。
+        """
+        entries = self.__entries()
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes and (self.max_entries is None or count <= self.max_entries):
+                break
+            self.__remove(path)
+            total -= size
+            count -= 1
@@ -0,0 +1,400 @@
+"""
+シミュレーション結果を保存し、投資計画を比較するための結果ストアを定義するモジュール。
+
+結果は埋め込みのSQLiteファイルに行単位で追記する。パスごとの統計量は1パスを1行とする表に保存し、
+新しい指標はALTER TABLEで列を追加して記録する。パスごとの統計量に加えて、
+実行ごとの集計値（平均、標準偏差、パーセンタイルなど）を追記時に計算して保存するため、
+投資計画の順位付けや比較はパスごとのデータを読み込まずに行える。
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from helper.config import Config
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+STATISTICS = ('count', 'mean', 'std', 'min', 'p05', 'p25', 'p50', 'p75', 'p95', 'max')
+
+
+class ResultsStore:
+    """
+    シミュレーション結果の保存と検索を行うクラス。
+
+    Attributes
+    ----------
+    path : str
+        SQLiteファイルのパス。
+    connection : sqlite3.Connection
+        データベースへの接続。
+
+    Methods
+    -------
+    plan_hash(plan: dict)
+        投資計画のハッシュを計算する静的メソッド。
+    start_run(plan: dict, params: dict = None)
+        実行を登録し、実行IDを返すメソッド。
+    append_paths(run_id: int, stats: dict, curves: np.ndarray = None, path_offset: int = None)
+        パスごとの統計量と評価額の推移を追記するメソッド。
+    finish_run(run_id: int)
+        実行ごとの集計値を計算して保存するメソッド。
+    append_run(plan: dict, params: dict, stats: dict, curves: np.ndarray = None)
+        実行の登録、パスの追記、集計をまとめて行うメソッド。
+    rank_plans(metric: str, statistic: str = 'mean', ascending: bool = False, limit: int = None,
+               params: dict = None, run_ids: list = None)
+        指定した指標で投資計画を順位付けするメソッド。
+    compare(run_ids: list, metrics: list = None, statistic: str = 'mean')
+        複数の実行の指標を比較するメソッド。
+    load_paths(run_id: int, metrics: list = None)
+        実行のパスごとの統計量を取得するメソッド。
+    load_curve(run_id: int, path: int)
+        パスの評価額の推移を取得するメソッド。
+    close()
+        データベースへの接続を閉じるメソッド。
+    """
+
+    def __init__(self, path: str = None):
+        """
+        ResultsStoreクラスの初期化メソッド。
+
+        Parameters
+        ----------
+        path : str, optional
+            SQLiteファイルのパス。省略した場合は設定ファイルのresults_store_pathを用いる。
+        """
+        if path is None:
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            path = os.path.join(base_dir, Config().config.get('results_store_path', '.cache/results.sqlite'))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                plan_hash TEXT NOT NULL,
+                plan TEXT NOT NULL,
+                params TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                n_paths INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS runs_plan_hash ON runs (plan_hash);
+            CREATE TABLE IF NOT EXISTS path_stats (
+                run_id INTEGER NOT NULL,
+                path INTEGER NOT NULL,
+                PRIMARY KEY (run_id, path)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS run_metrics (
+                run_id INTEGER NOT NULL,
+                metric TEXT NOT NULL,
+                count INTEGER, mean REAL, std REAL, min REAL,
+                p05 REAL, p25 REAL, p50 REAL, p75 REAL, p95 REAL, max REAL,
+                PRIMARY KEY (run_id, metric)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS run_metrics_metric ON run_metrics (metric);
+            CREATE TABLE IF NOT EXISTS curves (
+                run_id INTEGER NOT NULL,
+                path INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (run_id, path)
+            ) WITHOUT ROWID;
+        ''')
+
+    @staticmethod
+    def plan_hash(plan: dict):
+        """
+        投資計画のハッシュを計算する静的メソッド。
+
+        Parameters
+        ----------
+        plan : dict
+            投資計画を表す辞書。
+
+        Returns
+        -------
+        str
+            投資計画のハッシュ（SHA-256の先頭16文字）。
+        """
+        return hashlib.sha256(json.dumps(plan, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    def __columns(self):
+        """
+        path_statsの指標の列名を取得するプライベートメソッド。
+        """
+        rows = self.connection.execute('PRAGMA table_info(path_stats)').fetchall()
+        return [row[1] for row in rows if row[1] not in ('run_id', 'path')]
+
+    def __check_metric(self, metric: str):
+        """
+        指標の名前が列名として使えるか確認するプライベートメソッド。
+        """
+        if not IDENTIFIER.match(metric):
+            raise ValueError(f'Invalid metric name: {metric}')
+
+    def start_run(self, plan: dict, params: dict = None):
+        """
+        実行を登録し、実行IDを返すメソッド。
+
+        Parameters
+        ----------
+        plan : dict
+            投資計画を表す辞書。
+        params : dict, optional
+            戦略やシミュレーションのパラメータ。
+
+        Returns
+        -------
+        int
+            実行ID。
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (plan_hash, plan, params, created_at) VALUES (?, ?, ?, ?)',
+                (self.plan_hash(plan), json.dumps(plan, sort_keys=True), json.dumps(params or {}, sort_keys=True,
+                                                                                   default=str),
+                 datetime.now().isoformat()))
+        return cursor.lastrowid
+
+    def append_paths(self, run_id: int, stats: dict, curves=None, path_offset: int = None):
+        """
+        パスごとの統計量と評価額の推移を追記するメソッド。
+
+        ChunkedSimulator.run()の結果をチャンクごとに渡すことを想定する。
+
+        Parameters
+        ----------
+        run_id : int
+            実行ID。
+        stats : dict
+            指標の名前をキー、パスごとの値の配列を値とする辞書。
+        curves : np.ndarray, optional
+            パスごとの評価額の推移。形状は(パス数, 時点数)。
+        path_offset : int, optional
+            最初のパスの番号。省略した場合はこれまでに追記したパス数とする。
+        """
+        stats = {metric: np.asarray(values, dtype=float).ravel() for metric, values in stats.items()
+                 if np.ndim(values) > 0}
+        for metric in stats:
+            self.__check_metric(metric)
+        n_paths = len(next(iter(stats.values()))) if stats else len(curves)
+        if path_offset is None:
+            path_offset = self.connection.execute('SELECT n_paths FROM runs WHERE run_id = ?',
+                                                  (run_id,)).fetchone()[0]
+        paths = np.arange(path_offset, path_offset + n_paths)
+        with self.connection:
+            existing = set(self.__columns())
+            for metric in stats:
+                if metric not in existing:
+                    self.connection.execute(f'ALTER TABLE path_stats ADD COLUMN "{metric}" REAL')
+            metrics = list(stats)
+            columns = ', '.join(['run_id', 'path'] + [f'"{metric}"' for metric in metrics])
+            placeholders = ', '.join(['?'] * (len(metrics) + 2))
+            rows = zip([run_id] * n_paths, paths.tolist(), *[stats[metric].tolist() for metric in metrics])
+            self.connection.executemany(f'INSERT INTO path_stats ({columns}) VALUES ({placeholders})', rows)
+            if curves is not None:
+                curves = np.asarray(curves, dtype=np.float64)
+                self.connection.executemany('INSERT INTO curves (run_id, path, data) VALUES (?, ?, ?)',
+                                            zip([run_id] * n_paths, paths.tolist(),
+                                                [curve.tobytes() for curve in curves]))
+            self.connection.execute('UPDATE runs SET n_paths = MAX(n_paths, ?) WHERE run_id = ?',
+                                    (int(path_offset + n_paths), run_id))
+
+    def finish_run(self, run_id: int):
+        """
+        実行ごとの集計値を計算して保存するメソッド。
+
+        Parameters
+        ----------
+        run_id : int
+            実行ID。
+        """
+        paths = self.load_paths(run_id)
+        rows = []
+        for metric in paths.columns:
+            values = paths[metric].dropna().to_numpy()
+            if len(values) == 0:
+                continue
+            quantiles = np.quantile(values, [0.05, 0.25, 0.5, 0.75, 0.95])
+            std = float(values.std(ddof=1)) if len(values) > 1 else float('nan')
+            rows.append((run_id, metric, len(values), float(values.mean()), std, float(values.min()),
+                         *quantiles.tolist(), float(values.max())))
+        with self.connection:
+            self.connection.execute('DELETE FROM run_metrics WHERE run_id = ?', (run_id,))
+            self.connection.executemany(f'INSERT INTO run_metrics VALUES ({", ".join(["?"] * 12)})', rows)
+
+    def append_run(self, plan: dict, params: dict, stats: dict, curves=None):
+        """
+        実行の登録、パスの追記、集計をまとめて行うメソッド。
+
+        Parameters
+        ----------
+        plan : dict
+            投資計画を表す辞書。
+        params : dict
+            戦略やシミュレーションのパラメータ。
+        stats : dict
+            指標の名前をキー、パスごとの値の配列を値とする辞書。
+        curves : np.ndarray, optional
+            パスごとの評価額の推移。
+
+        Returns
+        -------
+        int
+            実行ID。
+        """
+        run_id = self.start_run(plan, params)
+        self.append_paths(run_id, stats, curves, path_offset=0)
+        self.finish_run(run_id)
+        return run_id
+
+    def rank_plans(self, metric: str, statistic: str = 'mean', ascending: bool = False, limit: int = None,
+                   params: dict = None, run_ids=None):
+        """
+        指定した指標で投資計画を順位付けするメソッド。
+
+        投資計画ごとに、指標の集計値がある実行のうち最新のものを用いる。集計前の実行は対象としないため、
+        実行中の計画も前回の実行の集計値で順位付けする。paramsやrun_idsを指定すると、
+        1回のパラメータ探索の実行だけを順位付けできる。
+
+        Parameters
+        ----------
+        metric : str
+            順位付けに用いる指標の名前。
+        statistic : str, optional
+            用いる集計値（'mean', 'std', 'p05', 'p50'など）。デフォルトは'mean'。
+        ascending : bool, optional
+            昇順に並べるかどうか。デフォルトはFalse（大きい順）。
+        limit : int, optional
+            取得する件数。
+        params : dict, optional
+            パラメータの条件。指定したキーと値をすべて含むパラメータの実行だけを対象とする。
+        run_ids : list, optional
+            対象とする実行IDのリスト。
+
+        Returns
+        -------
+        pd.DataFrame
+            実行ID、投資計画のハッシュ、投資計画、パラメータ、集計値の表。
+        """
+        if statistic not in STATISTICS:
+            raise ValueError(f'Invalid statistic: {statistic}')
+        candidates = None if run_ids is None else {int(run_id) for run_id in run_ids}
+        if params is not None:
+            # 保存時と同じ変換をしてから比較する
+            params = json.loads(json.dumps(params, sort_keys=True, default=str))
+            matched = set()
+            for run_id, stored in self.connection.execute('SELECT run_id, params FROM runs'):
+                stored = json.loads(stored)
+                if all(key in stored and stored[key] == value for key, value in params.items()):
+                    matched.add(run_id)
+            candidates = matched if candidates is None else candidates & matched
+        condition = ''
+        query_params = [metric]
+        if candidates is not None:
+            condition = f'AND r.run_id IN ({", ".join(["?"] * len(candidates))})'
+            query_params += sorted(candidates)
+        query_params.append(metric)
+        query = f'''
+            WITH latest AS (
+                SELECT MAX(r.run_id) AS run_id FROM runs r JOIN run_metrics m ON m.run_id = r.run_id
+                WHERE m.metric = ? {condition}
+                GROUP BY r.plan_hash
+            )
+            SELECT r.run_id, r.plan_hash, r.plan, r.params, m.{statistic} AS value
+            FROM latest JOIN runs r ON r.run_id = latest.run_id
+            JOIN run_metrics m ON m.run_id = r.run_id AND m.metric = ?
+            ORDER BY value {'ASC' if ascending else 'DESC'}
+        '''
+        if limit is not None:
+            query += ' LIMIT ?'
+            query_params.append(int(limit))
+        return pd.read_sql_query(query, self.connection, params=query_params)
+
+    def compare(self, run_ids, metrics=None, statistic: str = 'mean'):
+        """
+        複数の実行の指標を比較するメソッド。
+
+        Parameters
+        ----------
+        run_ids : list
+            比較する実行IDのリスト。
+        metrics : list, optional
+            比較する指標の名前のリスト。省略した場合はすべての指標。
+        statistic : str, optional
+            比較に用いる集計値。デフォルトは'mean'。
+
+        Returns
+        -------
+        pd.DataFrame
+            実行IDをインデックス、指標を列とする表。
+        """
+        if statistic not in STATISTICS:
+            raise ValueError(f'Invalid statistic: {statistic}')
+        run_ids = [int(run_id) for run_id in run_ids]
+        query = f'''
+            SELECT run_id, metric, {statistic} AS value FROM run_metrics
+            WHERE run_id IN ({", ".join(["?"] * len(run_ids))})
+        '''
+        table = pd.read_sql_query(query, self.connection, params=run_ids)
+        table = table.pivot(index='run_id', columns='metric', values='value')
+        return table if metrics is None else table.reindex(columns=metrics)
+
+    def load_paths(self, run_id: int, metrics=None):
+        """
+        実行のパスごとの統計量を取得するメソッド。
+
+        Parameters
+        ----------
+        run_id : int
+            実行ID。
+        metrics : list, optional
+            取得する指標の名前のリスト。省略した場合はすべての指標。
+
+        Returns
+        -------
+        pd.DataFrame
+            パスの番号をインデックス、指標を列とする表。
+        """
+        select_all = metrics is None
+        metrics = self.__columns() if select_all else list(metrics)
+        for metric in metrics:
+            self.__check_metric(metric)
+        columns = ', '.join(['path'] + [f'"{metric}"' for metric in metrics])
+        table = pd.read_sql_query(f'SELECT {columns} FROM path_stats WHERE run_id = ? ORDER BY path',
+                                  self.connection, params=[int(run_id)], index_col='path')
+        # 他の実行でのみ記録された指標の列は除く
+        return table.dropna(axis=1, how='all') if select_all and len(table) > 0 else table
+
+    def load_curve(self, run_id: int, path: int):
+        """
+        パスの評価額の推移を取得するメソッド。
+
+        Parameters
+        ----------
+        run_id : int
+            実行ID。
+        path : int
+            パスの番号。
+
+        Returns
+        -------
+        np.ndarray
+            評価額の推移。保存していない場合はNone。
+        """
+        row = self.connection.execute('SELECT data FROM curves WHERE run_id = ? AND path = ?',
+                                      (int(run_id), int(path))).fetchone()
+        return None if row is None else np.frombuffer(row[0], dtype=np.float64)
+
+    def close(self):
+        """
+        データベースへの接続を閉じるメソッド。
+        """
+        self.connection.close()
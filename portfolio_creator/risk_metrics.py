@@ -0,0 +1,516 @@
+"""
+シミュレーション結果のリスク統計量をストリーミングで集計するモジュール。
+
+モンテカルロ法の各パスの結果をチャンク単位で受け取り、すべてのパスを保持せずに
+平均、分散、パーセンタイル、最大ドローダウン、シャープレシオ、ソルティノレシオ、VaR、CVaRを計算する。
+各集計器はマージ可能であり、ワーカープロセスごとに集計した結果を結合できる。
+"""
+
+import numpy as np
+
+
+def finite_values(values):
+    """
+    配列を1次元にし、有限の値のみを取り出す関数。
+
+    RunningMomentsとQuantileSketchで同じサンプルを集計するために用いる。
+
+    Parameters
+    ----------
+    values : np.ndarray
+        サンプルの配列。
+
+    Returns
+    -------
+    np.ndarray
+        有限の値のみの1次元配列。
+    """
+    values = np.asarray(values, dtype=float).ravel()
+    return values[np.isfinite(values)]
+
+
+class RunningMoments:
+    """
+    Welford法によるオンラインの平均・分散推定を行うクラス。
+
+    Attributes
+    ----------
+    count : int
+        集計したサンプル数。
+    mean : float
+        平均。
+    m2 : float
+        平均からの偏差の二乗和。
+    min : float
+        最小値。
+    max : float
+        最大値。
+
+    Methods
+    -------
+    update(values: np.ndarray)
+        サンプルのチャンクを集計に加えるメソッド。
+    merge(other: RunningMoments)
+        別の集計結果を結合するメソッド。
+    variance(ddof: int = 1)
+        分散を取得するメソッド。
+    std(ddof: int = 1)
+        標準偏差を取得するメソッド。
+    """
+
+    def __init__(self):
+        """
+        RunningMomentsクラスの初期化メソッド。
+        """
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        """
+        サンプルのチャンクを集計に加えるメソッド。有限でない値は除く。
+
+        Parameters
+        ----------
+        values : np.ndarray
+            サンプルの配列。
+        """
+        values = finite_values(values)
+        if values.size == 0:
+            return
+        # チャンク内の統計量を計算してから結合する（Chanらの並列アルゴリズム）
+        chunk = RunningMoments()
+        chunk.count = values.size
+        chunk.mean = float(values.mean())
+        chunk.m2 = float(((values - chunk.mean) ** 2).sum())
+        chunk.min = float(values.min())
+        chunk.max = float(values.max())
+        self.merge(chunk)
+
+    def merge(self, other):
+        """
+        別の集計結果を結合するメソッド。
+
+        Parameters
+        ----------
+        other : RunningMoments
+            結合する集計結果。
+        """
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def variance(self, ddof: int = 1):
+        """
+        分散を取得するメソッド。
+
+        Parameters
+        ----------
+        ddof : int, optional
+            自由度の補正。デフォルトは1（不偏分散）。
+
+        Returns
+        -------
+        float
+            分散。サンプル数が足りない場合はNaN。
+        """
+        if self.count - ddof <= 0:
+            return np.nan
+        return self.m2 / (self.count - ddof)
+
+    def std(self, ddof: int = 1):
+        """
+        標準偏差を取得するメソッド。
+
+        Parameters
+        ----------
+        ddof : int, optional
+            自由度の補正。デフォルトは1。
+
+        Returns
+        -------
+        float
+            標準偏差。
+        """
+        return float(np.sqrt(self.variance(ddof)))
+
+
+class QuantileSketch:
+    """
+    相対誤差を保証するマージ可能な分位点スケッチ（DDSketch）を表すクラス。
+
+    値を対数スケールのバケットに数え上げることで、メモリ使用量を値の範囲の対数に抑える。
+    返す分位点は、真の分位点に対して相対誤差relative_accuracy以内に収まる。
+
+    Attributes
+    ----------
+    relative_accuracy : float
+        分位点の相対誤差の上限。
+    gamma : float
+        バケットの幅を決める比率。
+    positive : dict
+        正の値のバケットのインデックスと件数。
+    negative : dict
+        負の値（絶対値）のバケットのインデックスと件数。
+    zero_count : int
+        0とみなす値の件数。
+    count : int
+        集計したサンプル数。
+
+    Methods
+    -------
+    update(values: np.ndarray)
+        サンプルのチャンクを集計に加えるメソッド。
+    merge(other: QuantileSketch)
+        別のスケッチを結合するメソッド。
+    quantile(q: float)
+        分位点を取得するメソッド。
+    tail_mean(q: float)
+        下側q分位点以下の値の平均を取得するメソッド。
+    """
+    MIN_INDEXABLE = 1e-12
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        """
+        QuantileSketchクラスの初期化メソッド。
+
+        Parameters
+        ----------
+        relative_accuracy : float, optional
+            分位点の相対誤差の上限。デフォルトは0.01（1%）。
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy must be between 0 and 1')
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def __add_to_store(self, store, values):
+        """
+        値をバケットに数え上げるプライベートメソッド。
+        """
+        if values.size == 0:
+            return
+        keys = np.ceil(np.log(values) / self.log_gamma).astype(np.int64)
+        unique_keys, counts = np.unique(keys, return_counts=True)
+        for key, count in zip(unique_keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def update(self, values):
+        """
+        サンプルのチャンクを集計に加えるメソッド。有限でない値は除く。
+
+        Parameters
+        ----------
+        values : np.ndarray
+            サンプルの配列。
+        """
+        values = finite_values(values)
+        self.__add_to_store(self.positive, values[values > self.MIN_INDEXABLE])
+        self.__add_to_store(self.negative, -values[values < -self.MIN_INDEXABLE])
+        self.zero_count += int((np.abs(values) <= self.MIN_INDEXABLE).sum())
+        self.count += values.size
+
+    def merge(self, other):
+        """
+        別のスケッチを結合するメソッド。
+
+        Parameters
+        ----------
+        other : QuantileSketch
+            結合するスケッチ。相対誤差が同じである必要がある。
+        """
+        if other.gamma != self.gamma:
+            raise ValueError('Cannot merge sketches with different relative accuracy')
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def __buckets(self):
+        """
+        バケットの代表値と件数を値の昇順で取得するプライベートメソッド。
+
+        Returns
+        -------
+        tuple
+            代表値の配列と件数の配列。
+        """
+        neg_keys = np.array(sorted(self.negative, reverse=True), dtype=float)
+        pos_keys = np.array(sorted(self.positive), dtype=float)
+        # バケット(gamma^(k-1), gamma^k]の代表値は相対誤差が最小となる2 * gamma^k / (gamma + 1)
+        scale = 2 / (self.gamma + 1)
+        values = np.concatenate([-scale * self.gamma ** neg_keys, [0.0], scale * self.gamma ** pos_keys])
+        counts = np.concatenate([[self.negative[int(k)] for k in neg_keys], [self.zero_count],
+                                 [self.positive[int(k)] for k in pos_keys]]).astype(float)
+        return values, counts
+
+    def quantile(self, q: float):
+        """
+        分位点を取得するメソッド。
+
+        Parameters
+        ----------
+        q : float
+            0から1の範囲の分位。
+
+        Returns
+        -------
+        float
+            分位点。サンプルがない場合はNaN。
+        """
+        if self.count == 0:
+            return np.nan
+        values, counts = self.__buckets()
+        rank = q * (self.count - 1)
+        index = np.searchsorted(np.cumsum(counts), rank, side='right')
+        return float(values[min(index, len(values) - 1)])
+
+    def tail_mean(self, q: float):
+        """
+        下側q分位点以下の値の平均を取得するメソッド。CVaRの計算に用いる。
+
+        Parameters
+        ----------
+        q : float
+            0から1の範囲の分位。
+
+        Returns
+        -------
+        float
+            下側の裾の平均。サンプルがない場合はNaN。
+        """
+        if self.count == 0:
+            return np.nan
+        values, counts = self.__buckets()
+        tail_count = max(q * self.count, 1.0)
+        # 裾に含まれる件数だけ下から順に取り出す
+        taken = np.minimum(counts, np.maximum(tail_count - (np.cumsum(counts) - counts), 0))
+        return float((values * taken).sum() / taken.sum())
+
+
+class DrawdownTracker:
+    """
+    時間方向のチャンクで与えられる評価額の推移から、パスごとの最大ドローダウンを逐次計算するクラス。
+
+    Attributes
+    ----------
+    peak : np.ndarray
+        パスごとのこれまでの評価額の最大値。
+    max_drawdown : np.ndarray
+        パスごとのこれまでの最大ドローダウン（正の割合）。
+
+    Methods
+    -------
+    update(equity: np.ndarray)
+        評価額の推移のチャンクを集計に加えるメソッド。
+    """
+
+    def __init__(self, n_paths: int):
+        """
+        DrawdownTrackerクラスの初期化メソッド。
+
+        Parameters
+        ----------
+        n_paths : int
+            パスの数。
+        """
+        self.peak = np.full(n_paths, -np.inf)
+        self.max_drawdown = np.zeros(n_paths)
+
+    def update(self, equity):
+        """
+        評価額の推移のチャンクを集計に加えるメソッド。
+
+        Parameters
+        ----------
+        equity : np.ndarray
+            評価額の推移。形状は(パス数, 時点数)。
+        """
+        equity = np.asarray(equity, dtype=float)
+        running_peak = np.maximum.accumulate(np.concatenate([self.peak[:, None], equity], axis=1), axis=1)[:, 1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdown = np.where(running_peak > 0, 1 - equity / running_peak, 0.0)
+        self.max_drawdown = np.maximum(self.max_drawdown, drawdown.max(axis=1, initial=0.0))
+        self.peak = running_peak[:, -1] if equity.shape[1] > 0 else self.peak
+
+
+class RiskMetrics:
+    """
+    モンテカルロ法の各パスの結果からリスク統計量を集計するクラス。
+
+    メモリ使用量はパス数や期間に依存せず一定であり、merge()でワーカーごとの集計結果を結合できる。
+    平均と分散は厳密に一致し、パーセンタイル、VaR、CVaRは相対誤差relative_accuracy以内で一致する。
+
+    Attributes
+    ----------
+    returns : RunningMoments
+        パスごとのリターンの平均・分散。
+    downside : RunningMoments
+        無リスク金利を下回る超過リターン（上側は0）の平均・分散。
+    return_sketch : QuantileSketch
+        パスごとのリターンの分位点スケッチ。
+    drawdowns : RunningMoments
+        パスごとの最大ドローダウンの平均・分散。
+    drawdown_sketch : QuantileSketch
+        パスごとの最大ドローダウンの分位点スケッチ。
+    risk_free_rate : float
+        シャープレシオ、ソルティノレシオの計算に用いる無リスク金利。
+    var_level : float
+        VaR、CVaRの信頼水準。
+
+    Methods
+    -------
+    update(returns: np.ndarray, max_drawdowns: np.ndarray = None)
+        パスごとの結果のチャンクを集計に加えるメソッド。
+    update_paths(equity: np.ndarray, principal: np.ndarray = None)
+        パスごとの評価額の推移のチャンクを集計に加えるメソッド。
+    merge(other: RiskMetrics)
+        別の集計結果を結合するメソッド。
+    percentile(q: float)
+        リターンのパーセンタイルを取得するメソッド。
+    summary()
+        リスク統計量をまとめて取得するメソッド。
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, risk_free_rate: float = 0.0, var_level: float = 0.95):
+        """
+        RiskMetricsクラスの初期化メソッド。
+
+        Parameters
+        ----------
+        relative_accuracy : float, optional
+            パーセンタイル、VaR、CVaRの相対誤差の上限。デフォルトは0.01。
+        risk_free_rate : float, optional
+            無リスク金利。デフォルトは0。
+        var_level : float, optional
+            VaR、CVaRの信頼水準。デフォルトは0.95。
+        """
+        self.returns = RunningMoments()
+        self.downside = RunningMoments()
+        self.return_sketch = QuantileSketch(relative_accuracy)
+        self.drawdowns = RunningMoments()
+        self.drawdown_sketch = QuantileSketch(relative_accuracy)
+        self.risk_free_rate = risk_free_rate
+        self.var_level = var_level
+
+    def update(self, returns, max_drawdowns=None):
+        """
+        パスごとの結果のチャンクを集計に加えるメソッド。
+
+        Parameters
+        ----------
+        returns : np.ndarray
+            パスごとのリターン。
+        max_drawdowns : np.ndarray, optional
+            パスごとの最大ドローダウン。
+        """
+        # 下方偏差の集計もリターンと同じサンプルで行うため、先に有限でない値を除く
+        returns = finite_values(returns)
+        self.returns.update(returns)
+        self.downside.update(np.minimum(returns - self.risk_free_rate, 0.0))
+        self.return_sketch.update(returns)
+        if max_drawdowns is not None:
+            self.drawdowns.update(max_drawdowns)
+            self.drawdown_sketch.update(max_drawdowns)
+
+    def update_paths(self, equity, principal=None):
+        """
+        パスごとの評価額の推移のチャンクを集計に加えるメソッド。
+
+        Parameters
+        ----------
+        equity : np.ndarray
+            評価額の推移。形状は(パス数, 時点数)。
+        principal : np.ndarray, optional
+            最終時点のパスごとの投資元本。省略した場合は初期評価額に対するリターンを計算する。
+        """
+        equity = np.asarray(equity, dtype=float)
+        tracker = DrawdownTracker(equity.shape[0])
+        tracker.update(equity)
+        base = equity[:, 0] if principal is None else np.asarray(principal, dtype=float)
+        self.update(equity[:, -1] / base - 1, tracker.max_drawdown)
+
+    def merge(self, other):
+        """
+        別の集計結果を結合するメソッド。
+
+        Parameters
+        ----------
+        other : RiskMetrics
+            結合する集計結果。
+        """
+        self.returns.merge(other.returns)
+        self.downside.merge(other.downside)
+        self.return_sketch.merge(other.return_sketch)
+        self.drawdowns.merge(other.drawdowns)
+        self.drawdown_sketch.merge(other.drawdown_sketch)
+
+    def percentile(self, q: float):
+        """
+        リターンのパーセンタイルを取得するメソッド。
+
+        Parameters
+        ----------
+        q : float
+            0から100の範囲のパーセンタイル。
+
+        Returns
+        -------
+        float
+            リターンのパーセンタイル。
+        """
+        return self.return_sketch.quantile(q / 100)
+
+    def summary(self):
+        """
+        リスク統計量をまとめて取得するメソッド。
+
+        Returns
+        -------
+        dict
+            リスク統計量の辞書。VaR、CVaRは損失を正の値で表す。
+        """
+        excess_mean = self.returns.mean - self.risk_free_rate
+        std = self.returns.std()
+        downside_deviation = np.sqrt(self.downside.m2 / self.downside.count + self.downside.mean ** 2) \
+            if self.downside.count > 0 else np.nan
+        tail = 1 - self.var_level
+        return {
+            'count': self.returns.count,
+            'mean': self.returns.mean,
+            'variance': self.returns.variance(),
+            'std': std,
+            'min': self.returns.min,
+            'max': self.returns.max,
+            'p05': self.percentile(5),
+            'p25': self.percentile(25),
+            'p50': self.percentile(50),
+            'p75': self.percentile(75),
+            'p95': self.percentile(95),
+            'sharpe': excess_mean / std if std > 0 else np.nan,
+            'sortino': excess_mean / downside_deviation if downside_deviation > 0 else np.nan,
+            'var': -self.return_sketch.quantile(tail),
+            'cvar': -self.return_sketch.tail_mean(tail),
+            'max_drawdown_mean': self.drawdowns.mean if self.drawdowns.count > 0 else np.nan,
+            'max_drawdown_p50': self.drawdown_sketch.quantile(0.5),
+            'max_drawdown_p95': self.drawdown_sketch.quantile(0.95),
+            'max_drawdown_max': self.drawdowns.max if self.drawdowns.count > 0 else np.nan,
+        }
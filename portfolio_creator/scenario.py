@@ -0,0 +1,214 @@
+"""
+過去の価格データからシミュレーション用のシナリオを生成するモジュール。
+
+全アセットで共通の日付に揃えた価格行列のリターンをブロック単位で復元抽出し、
+アセット間の相関と為替の影響を保ったまま多数の価格の推移をNumPy配列として生成する。
+"""
+
+import numpy as np
+
+
+class BlockBootstrap:
+    """
+    多資産のリターン行列をブロック・ブートストラップするシナリオ生成器を表すクラス。
+
+    Attributes
+    ----------
+    log_returns : np.ndarray
+        日次の対数リターン。形状は(時点数 - 1, アセット数)。
+    initial_prices : np.ndarray
+        生成する価格の推移の初期値。
+    block_length : int
+        復元抽出するブロックの長さ（取引日数）。
+    circular : bool
+        ブロックが期間の終わりを越える場合に期間の始めへ折り返すかどうか。
+
+    Methods
+    -------
+    from_prices(prices, block_length: int = 20, circular: bool = True)
+        価格行列からシナリオ生成器を作成するクラスメソッド。
+    sample_log_returns(n_paths: int, horizon: int, rng)
+        対数リターンの推移を生成するメソッド。
+    sample_block_starts(n_paths: int, horizon: int, rng)
+        パスごとに復元抽出するブロックの開始位置を生成するメソッド。
+    gather(starts: np.ndarray, start_step: int, end_step: int)
+        ブロックの開始位置から、指定した期間の対数リターンを取り出すメソッド。
+    sample_prices(n_paths: int, horizon: int, seed: int = None)
+        価格の推移を生成するメソッド。
+    """
+
+    def __init__(self, log_returns, initial_prices=None, block_length: int = 20, circular: bool = True):
+        """
+        BlockBootstrapクラスの初期化メソッド。
+
+        Parameters
+        ----------
+        log_returns : np.ndarray
+            日次の対数リターン。形状は(時点数, アセット数)。
+        initial_prices : np.ndarray, optional
+            生成する価格の推移の初期値。省略した場合はすべて1とする。
+        block_length : int, optional
+            復元抽出するブロックの長さ。デフォルトは20（約1ヶ月）。
+        circular : bool, optional
+            ブロックを期間の始めへ折り返すかどうか。デフォルトはTrue。
+        """
+        self.log_returns = np.asarray(log_returns, dtype=float)
+        if self.log_returns.ndim != 2:
+            raise ValueError('log_returns must be a 2-dimensional array')
+        n_returns = self.log_returns.shape[0]
+        if block_length < 1 or (not circular and block_length > n_returns):
+            raise ValueError(f'Invalid block length: {block_length}')
+        self.initial_prices = np.ones(self.log_returns.shape[1]) if initial_prices is None \
+            else np.asarray(initial_prices, dtype=float)
+        self.block_length = block_length
+        self.circular = circular
+
+    @classmethod
+    def from_prices(cls, prices, block_length: int = 20, circular: bool = True):
+        """
+        価格行列からシナリオ生成器を作成するクラスメソッド。
+
+        Parameters
+        ----------
+        prices : pd.DataFrame or np.ndarray
+            全アセットで日付を揃えた価格行列。Portfolio.get_price_matrix()の戻り値を想定する。
+        block_length : int, optional
+            復元抽出するブロックの長さ。
+        circular : bool, optional
+            ブロックを期間の始めへ折り返すかどうか。
+
+        Returns
+        -------
+        BlockBootstrap
+            シナリオ生成器。
+        """
+        prices = np.asarray(prices, dtype=float)
+        log_returns = np.diff(np.log(prices), axis=0)
+        return cls(log_returns, prices[-1], block_length, circular)
+
+    def sample_log_returns(self, n_paths: int, horizon: int, rng):
+        """
+        対数リターンの推移を生成するメソッド。
+
+        Parameters
+        ----------
+        n_paths : int
+            生成するパスの数。
+        horizon : int
+            生成する期間の長さ（時点数）。
+        rng : np.random.Generator
+            乱数生成器。
+
+        Returns
+        -------
+        np.ndarray
+            対数リターン。形状は(パス数, 期間の長さ, アセット数)。
+        """
+        return self.gather(self.sample_block_starts(n_paths, horizon, rng), 0, horizon)
+
+    def sample_block_starts(self, n_paths: int, horizon: int, rng):
+        """
+        パスごとに復元抽出するブロックの開始位置を生成するメソッド。
+
+        Parameters
+        ----------
+        n_paths : int
+            生成するパスの数。
+        horizon : int
+            生成する期間の長さ（時点数）。
+        rng : np.random.Generator
+            乱数生成器。
+
+        Returns
+        -------
+        np.ndarray
+            ブロックの開始位置。形状は(パス数, ブロック数)。
+        """
+        n_returns = self.log_returns.shape[0]
+        n_blocks = -(-horizon // self.block_length)
+        n_starts = n_returns if self.circular else n_returns - self.block_length + 1
+        return rng.integers(0, n_starts, size=(n_paths, n_blocks))
+
+    def gather(self, starts, start_step: int, end_step: int):
+        """
+        ブロックの開始位置から、指定した期間の対数リターンを取り出すメソッド。
+
+        期間を分割して取り出しても、まとめて取り出した場合と同じ結果になる。
+
+        Parameters
+        ----------
+        starts : np.ndarray
+            sample_block_starts()で生成したブロックの開始位置。
+        start_step : int
+            取り出す期間の開始時点。
+        end_step : int
+            取り出す期間の終了時点（この時点を含まない）。
+
+        Returns
+        -------
+        np.ndarray
+            対数リターン。形状は(パス数, end_step - start_step, アセット数)。
+        """
+        steps = np.arange(start_step, end_step)
+        # 各時点が属するブロックの開始位置にブロック内のオフセットを足して、抽出する時点のインデックスを一括で作る
+        index = starts[:, steps // self.block_length] + steps % self.block_length
+        if self.circular:
+            index %= self.log_returns.shape[0]
+        return self.log_returns[index]
+
+    def sample_prices(self, n_paths: int, horizon: int, seed: int = None):
+        """
+        価格の推移を生成するメソッド。
+
+        Parameters
+        ----------
+        n_paths : int
+            生成するパスの数。
+        horizon : int
+            生成する期間の長さ（時点数）。初期値を含む。
+        seed : int, optional
+            乱数のシード。
+
+        Returns
+        -------
+        np.ndarray
+            価格の推移。形状は(パス数, 期間の長さ, アセット数)。engine.run_dcaにそのまま渡せる。
+        """
+        rng = np.random.default_rng(seed)
+        log_returns = self.sample_log_returns(n_paths, horizon - 1, rng)
+        cumulative = np.concatenate([np.zeros((n_paths, 1, log_returns.shape[2])),
+                                     np.cumsum(log_returns, axis=1)], axis=1)
+        return self.initial_prices * np.exp(cumulative)
+
+
+def historical_windows(prices, horizon: int, n_paths: int = None, seed: int = None):
+    """
+    過去の価格行列からランダムな開始日の期間を切り出す関数。
+
+    README記載の開始日をランダムに選ぶバックテストを、ブートストラップのシナリオと同じ形状で生成する。
+
+    Parameters
+    ----------
+    prices : pd.DataFrame or np.ndarray
+        全アセットで日付を揃えた価格行列。
+    horizon : int
+        切り出す期間の長さ（時点数）。
+    n_paths : int, optional
+        切り出す期間の数。省略した場合はすべての開始日を用いる。
+    seed : int, optional
+        乱数のシード。
+
+    Returns
+    -------
+    tuple
+        開始位置の配列と、価格の推移（パス数, 期間の長さ, アセット数）。
+    """
+    prices = np.asarray(prices, dtype=float)
+    n_starts = prices.shape[0] - horizon + 1
+    if n_starts < 1:
+        raise ValueError(f'Horizon {horizon} is longer than the price history')
+    if n_paths is None:
+        starts = np.arange(n_starts)
+    else:
+        starts = np.random.default_rng(seed).integers(0, n_starts, size=n_paths)
+    return starts, prices[starts[:, None] + np.arange(horizon)]
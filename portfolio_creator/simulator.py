@@ -5,11 +5,17 @@
 # 追加投資はポートフォリオ内のキャッシュから行う。実施タイミングは弱気相場や調整局面などの評価額が低下した場合に行う。
 # 毎月の積立はポートフォリオの設定割合に基づいて行うが、弱気相場や調整局面では、キャッシュの積立を株式の積立に振り替えることができる。
 # 以上のシナリオで運用した場合の期待収益率と標準偏差を計算する。
+import numpy as np
 import pandas as pd
 
 import yfinance as yf
 
+from data_fetcher.day_index import to_day, to_days
 from data_fetcher.portfolio import Portfolio
+from portfolio_creator.engine import ChunkedSimulator, find_band_rebalances, run_dca, schedule_to_steps
+from portfolio_creator.result_cache import ResultCache, make_key
+from portfolio_creator.results_store import ResultsStore
+from portfolio_creator.scenario import BlockBootstrap
 
 if __name__ == '__main__':
     plan = {
@@ -53,6 +59,40 @@ if __name__ == '__main__':
         print(f"Valuation: {state[3]}")
         print()
 
+    # 比率の乖離が5%を超えたときにリバランスする場合の評価額を、同じ期間の過去の価格で計算する。
+    weights = [plan[investment.asset.ticker]['ratio'] for investment in portfolio.investments]
+    matrix = portfolio.get_price_matrix()
+    days = to_days(matrix.index)
+    prices = matrix[(days >= to_day(start_date)) & (days <= to_day(end_date))]
+    monthly = schedule_to_steps(prices.index, pd.date_range(start_date, end_date, freq='MS'), 20000)
+    rebalance = find_band_rebalances(prices.to_numpy(), weights, portfolio.cash_ratio, monthly, 0.05)
+    valuations, _, _ = run_dca(prices.to_numpy()[None], weights, portfolio.cash_ratio, monthly, rebalance)
+    print(f"Band rebalance dates: {list(prices.index[rebalance].strftime('%Y-%m-%d'))}")
+    print(f"Band rebalance valuation: {valuations[0, -1]}")
+
+    # ブロック・ブートストラップで生成したシナリオで同じ積立を評価し、結果ストアに保存する。
+    # 同じ条件のシミュレーションは結果キャッシュから読み込み、価格データが更新された場合のみ再計算する。
+    horizon = 252 * 3
+    contributions = np.zeros(horizon)
+    contributions[::21] = 20000
+    params = {'horizon': horizon, 'monthly': 20000, 'n_paths': 10000, 'block_length': 20}
+    seed = 0
+    data_version = portfolio.get_data_version()
+    simulator = ChunkedSimulator(BlockBootstrap.from_prices(portfolio.get_price_matrix(),
+                                                            block_length=params['block_length']),
+                                 weights, portfolio.cash_ratio, contributions)
+    cache = ResultCache()
+    cache.invalidate(data_version)
+    results = cache.get_or_compute(make_key(plan, data_version, contributions, params, seed),
+                                   lambda: list(simulator.run(params['n_paths'], seed=seed)), data_version)
+    store = ResultsStore()
+    run_id = store.start_run(plan, {**params, 'seed': seed})
+    for result in results:
+        store.append_paths(run_id, result)
+    store.finish_run(run_id)
+    print(store.compare([run_id], ['return', 'xirr', 'max_drawdown'], 'p50'))
+    print(store.rank_plans('xirr', 'p05', limit=5, params={**params, 'seed': seed}))
+
     print(portfolio.investments[0].asset.date_range)
     print(portfolio.investments[0].asset.info)
     print(portfolio.investments[0].asset.is_converted)
@@ -0,0 +1,125 @@
+"""
+金額加重収益率（XIRR）を計算するモジュール。
+
+積立のように入金の時期と金額が異なる場合でも比較できる年率の収益率を求める。
+多数のシミュレーションのパスを配列のまま一括で解くため、ニュートン法と二分法を組み合わせた
+ソルバーをすべてのパスで同時に反復する。
+"""
+
+import numpy as np
+
+DAYS_PER_YEAR = 365.0
+
+
+def xirr(cash_flows, times, tol: float = 1e-10, max_iter: int = 100):
+    """
+    キャッシュフローから金額加重収益率を一括で計算する関数。
+
+    各パスについて、sum(cash_flows * (1 + r) ** -times) = 0となる年率rを求める。
+    解を挟む区間を保ったままニュートン法で更新し、区間の外に出る場合は二分法に切り替える。
+
+    Parameters
+    ----------
+    cash_flows : np.ndarray
+        キャッシュフロー。入金を負、評価額（出金）を正とする。形状は(パス数, フロー数)または(フロー数,)。
+        パスごとにフロー数が異なる場合は0で埋める。
+    times : np.ndarray
+        最初のフローからの経過年数。形状は(フロー数,)またはcash_flowsと同じ。
+    tol : float, optional
+        収束判定に用いる対数収益率の許容誤差。デフォルトは1e-10。
+    max_iter : int, optional
+        最大の反復回数。デフォルトは100。
+
+    Returns
+    -------
+    np.ndarray or float
+        パスごとの年率の収益率。解を挟む区間がない場合（符号の変化がない場合など）はNaN。
+    """
+    cash_flows = np.asarray(cash_flows, dtype=float)
+    scalar = cash_flows.ndim == 1
+    cash_flows = np.atleast_2d(cash_flows)
+    times = np.broadcast_to(np.asarray(times, dtype=float), cash_flows.shape)
+    # x = log(1 + r)とし、最後のフローの時点を基準に割り引くことで指数のオーバーフローを防ぐ
+    horizon = times.max(axis=1, keepdims=True) - times
+
+    def npv(x, rows):
+        flows = cash_flows[rows] * np.exp(x[:, None] * horizon[rows])
+        return flows.sum(axis=1), np.einsum('ij,ij->i', flows, horizon[rows])
+
+    every = np.arange(cash_flows.shape[0])
+    lower = np.full(cash_flows.shape[0], -5.0)
+    upper = np.full(cash_flows.shape[0], 5.0)
+    value_lower, _ = npv(lower, every)
+    value_upper, _ = npv(upper, every)
+    bracketed = np.sign(value_lower) * np.sign(value_upper) < 0
+    x = np.zeros(cash_flows.shape[0])
+    # 収束していないパスだけを計算する
+    rows = np.flatnonzero(bracketed)
+    for _ in range(max_iter):
+        if rows.size == 0:
+            break
+        value, derivative = npv(x[rows], rows)
+        # 根を挟む区間を関数値の符号で狭める
+        same_as_lower = np.sign(value) == np.sign(value_lower[rows])
+        lower[rows] = np.where(same_as_lower, x[rows], lower[rows])
+        upper[rows] = np.where(same_as_lower, upper[rows], x[rows])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = x[rows] - value / derivative
+        use_newton = np.isfinite(newton) & (newton >= lower[rows]) & (newton <= upper[rows])
+        candidate = np.where(use_newton, newton, (lower[rows] + upper[rows]) / 2)
+        converged = (np.abs(candidate - x[rows]) < tol) | (upper[rows] - lower[rows] < tol) | (value == 0)
+        x[rows] = np.where(value != 0, candidate, x[rows])
+        rows = rows[~converged]
+    rate = np.where(bracketed, np.expm1(x), np.nan)
+    return float(rate[0]) if scalar else rate
+
+
+def dca_cash_flows(days, contributions, final_day: int, final_valuations, days_per_year: float = DAYS_PER_YEAR):
+    """
+    積立の履歴と最終的な評価額から、xirrに渡すキャッシュフローを作成する関数。
+
+    Parameters
+    ----------
+    days : np.ndarray
+        積立を行った日付の日番号。シミュレーションの時点の番号を渡すこともできる。
+    contributions : np.ndarray
+        積立額。形状は(積立回数,)または(パス数, 積立回数)。
+    final_day : int
+        評価額を計算した日付の日番号。
+    final_valuations : float or np.ndarray
+        評価額。パスごとに指定することもできる。
+    days_per_year : float, optional
+        1年あたりの日数。時点の番号を渡す場合は1年あたりの時点数とする。デフォルトは365。
+
+    Returns
+    -------
+    tuple
+        キャッシュフロー（パス数, 積立回数 + 1）と最初の積立からの経過年数（積立回数 + 1,）。
+    """
+    days = np.asarray(days, dtype=np.int64)
+    final_valuations = np.atleast_1d(np.asarray(final_valuations, dtype=float))
+    contributions = np.broadcast_to(np.asarray(contributions, dtype=float),
+                                    (final_valuations.shape[0], days.shape[0]))
+    cash_flows = np.concatenate([-contributions, final_valuations[:, None]], axis=1)
+    times = (np.append(days, final_day) - days.min()) / days_per_year
+    return cash_flows, times
+
+
+def portfolio_xirr(portfolio, date: str):
+    """
+    ポートフォリオの入金の履歴と特定の日付の評価額から金額加重収益率を計算する関数。
+
+    Parameters
+    ----------
+    portfolio : Portfolio
+        対象のポートフォリオ。
+    date : str
+        評価額を取得する日付。
+
+    Returns
+    -------
+    float
+        年率の金額加重収益率。
+    """
+    days, flows = portfolio.get_cash_flows(date)
+    return xirr(flows, (days - days.min()) / DAYS_PER_YEAR)
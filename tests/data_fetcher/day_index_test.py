@@ -0,0 +1,45 @@
+import unittest
+
+import pandas as pd
+
+from data_fetcher.day_index import to_day, to_days, to_timestamp, index_to_days, days_to_index, exchange_timezone
+from data_fetcher.investment import Trade
+
+
+class TestDayIndex(unittest.TestCase):
+    def test_to_day(self):
+        self.assertEqual(to_day('1970-01-02'), 1)
+        self.assertEqual(to_day('1969-12-31'), -1)
+        self.assertEqual(to_day(19000), 19000)
+        # タイムゾーン付きの日付は現地の日付を用いる
+        self.assertEqual(to_day(pd.Timestamp('2024-01-05 00:00', tz='Asia/Tokyo')), to_day('2024-01-05'))
+        self.assertEqual(to_day(pd.Timestamp('2024-01-05 23:00', tz='America/New_York')), to_day('2024-01-05'))
+
+    def test_to_days_integer_input(self):
+        expected = [to_day('2024-01-04'), to_day('2024-01-05')]
+        self.assertEqual(list(to_days(expected)), expected)
+        self.assertEqual(list(to_days(tuple(expected))), expected)
+        self.assertEqual(list(to_days(['2024-01-04', '2024-01-05'])), expected)
+
+    def test_round_trip(self):
+        self.assertEqual(to_timestamp(to_day('2021-12-10')), pd.Timestamp('2021-12-10'))
+        index = pd.DatetimeIndex(['2024-01-04', '2024-01-05'])
+        self.assertTrue(days_to_index(index_to_days(index)).equals(index))
+
+    def test_index_to_days_uses_exchange_timezone(self):
+        tokyo = pd.DatetimeIndex(['2024-01-04', '2024-01-05']).tz_localize('Asia/Tokyo')
+        new_york = pd.DatetimeIndex(['2024-01-04', '2024-01-05']).tz_localize('America/New_York')
+        self.assertEqual(list(index_to_days(tokyo)), list(index_to_days(new_york)))
+
+    def test_exchange_timezone(self):
+        self.assertEqual(exchange_timezone('2012.T'), 'Asia/Tokyo')
+        self.assertEqual(exchange_timezone('AAPL'), 'America/New_York')
+
+    def test_trade_date(self):
+        trade = Trade('2021-12-10', Trade.Type.BUY, 100000)
+        self.assertEqual(trade.day, to_day('2021-12-10'))
+        self.assertEqual(trade.date, pd.Timestamp('2021-12-10'))
+
+
+if __name__ == '__main__':
+    unittest.main()
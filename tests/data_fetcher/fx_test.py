@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from data_fetcher.fx import FxMatrix
+
+
+class TestFxMatrix(unittest.TestCase):
+    def setUp(self):
+        self.fx = FxMatrix()
+        index = pd.DatetimeIndex(['2024-01-02', '2024-01-03', '2024-01-05'])
+        self.fx.add_rates(pd.DataFrame({'JPY': [140.0, 142.0, 145.0], 'EUR': [0.9, 0.91, 0.92]}, index=index))
+
+    def test_cross_rate(self):
+        rate = self.fx.rate('EUR', 'JPY')
+        self.assertAlmostEqual(rate.loc['2024-01-02'], 140.0 / 0.9)
+        # 休日はfillna_methodで埋める
+        self.assertAlmostEqual(rate.loc['2024-01-04'], 142.0 / 0.91)
+        self.assertAlmostEqual(self.fx.rate('JPY', 'USD').loc['2024-01-05'], 1 / 145.0)
+        self.assertIs(self.fx.rate('EUR', 'JPY'), rate)
+
+    def test_coverage(self):
+        self.assertEqual(self.fx.coverage['JPY'], (pd.Timestamp('2024-01-02'), pd.Timestamp('2024-01-05')))
+        self.fx.add_rates(pd.DataFrame({'JPY': [150.0, 151.0]},
+                                       index=pd.DatetimeIndex(['2024-01-05', '2024-01-08'])))
+        self.assertEqual(self.fx.coverage['JPY'], (pd.Timestamp('2024-01-02'), pd.Timestamp('2024-01-08')))
+        self.assertEqual(self.fx.coverage['EUR'], (pd.Timestamp('2024-01-02'), pd.Timestamp('2024-01-05')))
+        # 重なる日付は追加したレートで上書きする
+        self.assertAlmostEqual(self.fx.rate('USD', 'JPY').loc['2024-01-05'], 150.0)
+        self.assertAlmostEqual(self.fx.rate('USD', 'JPY').loc['2024-01-03'], 142.0)
+
+    def test_fetch_extends_range(self):
+        history = pd.DataFrame({'Close': [139.0, 140.0]}, index=pd.DatetimeIndex(['2023-12-29', '2024-01-02']))
+        with mock.patch('data_fetcher.fx.yf.Ticker') as ticker:
+            ticker.return_value.history.return_value = history
+            self.fx.fetch(['JPY', 'EUR'], '2024-01-02', '2024-01-05')
+            ticker.assert_not_called()
+            self.fx.fetch(['JPY'], '2023-12-29', '2024-01-05')
+            ticker.assert_called_once_with('USDJPY=X')
+            ticker.return_value.history.assert_called_once_with(start='2023-12-29', end='2024-01-05')
+        self.assertEqual(self.fx.coverage['JPY'], (pd.Timestamp('2023-12-29'), pd.Timestamp('2024-01-05')))
+        self.assertAlmostEqual(self.fx.rate('USD', 'JPY').loc['2023-12-29'], 139.0)
+
+    def test_rate_not_fetched(self):
+        with self.assertRaises(ValueError):
+            self.fx.rate('GBP', 'JPY')
+
+    def test_convert(self):
+        index = pd.DatetimeIndex(['2024-01-02', '2024-01-04'])
+        prices = pd.DataFrame({'AAPL': [10.0, 11.0], 'SAP': [100.0, 101.0], '2012.T': [1000.0, 1001.0]}, index=index)
+        converted = self.fx.convert(prices, ['USD', 'EUR', 'JPY'], 'JPY')
+        np.testing.assert_allclose(converted['AAPL'], [1400.0, 11.0 * 142.0])
+        np.testing.assert_allclose(converted['SAP'], [100.0 * 140.0 / 0.9, 101.0 * 142.0 / 0.91])
+        np.testing.assert_allclose(converted['2012.T'], prices['2012.T'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -28,6 +28,23 @@ class TestInvestment(unittest.TestCase):
         self.assertEqual(valuation,
                          self.asset.data.loc[Timestamp(date).tz_localize('America/New_York'), 'Close'] * shares)
 
+    def test_get_tax_report(self):
+        self.investment.record_trade('2021-12-01', Trade.Type.BUY, 100000)
+        self.investment.record_trade('2022-06-01', Trade.Type.BUY, 100000)
+        self.investment.record_trade('2022-09-01', Trade.Type.SELL, 50000)
+        for trade in self.investment.trades:
+            trade.tax_rate = 0.20315
+        report = self.investment.get_tax_report(['2022-01-04', '2022-12-01'])
+        self.assertEqual(report['realized_gain'].iloc[0], 0)
+        self.assertEqual(report['tax'].iloc[0], 0)
+        average_share_price, shares, principal, valuation = self.investment.get_state_at('2022-12-01')
+        self.assertAlmostEqual(report['shares'].iloc[1], shares)
+        self.assertAlmostEqual(report['valuation'].iloc[1], valuation)
+        self.assertAlmostEqual(report['tax'].iloc[1], max(report['realized_gain'].iloc[1], 0) * 0.20315)
+        # 台帳に記録した取引には取引後の1口あたりの取得価額が設定される
+        self.assertAlmostEqual(self.investment.trades[-1].average_share_price,
+                               report['cost_basis'].iloc[1] / report['shares'].iloc[1])
+
 
 if __name__ == '__main__':
     unittest.main()
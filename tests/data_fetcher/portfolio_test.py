@@ -1,5 +1,11 @@
 import unittest
+
+import numpy as np
+import pandas as pd
+
 from data_fetcher.asset import Asset
+from data_fetcher.investment import Investment, Trade
+from data_fetcher.fx import FxMatrix
 from data_fetcher.portfolio import Portfolio
 
 
@@ -56,6 +62,14 @@ class TestPortfolio(unittest.TestCase):
             self.assertEqual(self.portfolio.date_range[0], investment.asset.data.index.min())
             self.assertEqual(self.portfolio.date_range[1], investment.asset.data.index.max())
 
+    def test_get_price_matrix(self):
+        prices = self.portfolio.get_price_matrix()
+        self.assertEqual(list(prices.columns), ['AAPL', 'GOOGL'])
+        self.assertIs(self.portfolio.get_price_matrix(), prices)
+        prices_usd = self.portfolio.get_price_matrix('USD')
+        rate = self.portfolio.fx.rate('JPY', 'USD').reindex(prices.index)
+        self.assertAlmostEqual(prices_usd['AAPL'].iloc[-1], prices['AAPL'].iloc[-1] * rate.iloc[-1])
+
     def test_invest_all(self):
         self.portfolio.invest_all('2021-12-01', 100000)
         self.assertEqual(self.portfolio.principal, 100000)
@@ -65,6 +79,18 @@ class TestPortfolio(unittest.TestCase):
             self.assertEqual(investment.trades[0].amount,
                              100000 * self.portfolio.plan[investment.asset.ticker]['ratio'])
 
+    def test_invest_schedule(self):
+        dates = ['2021-12-01', '2022-01-01', '2022-02-01']
+        self.portfolio.invest_schedule(dates, [100000, 100000, 300000])
+        self.assertEqual(self.portfolio.principal, 500000)
+        self.assertEqual(self.portfolio.cash, 50000)
+        expected = Investment(self.portfolio.investments[0].asset)
+        for date, amount in zip(dates, [100000, 100000, 300000]):
+            expected.record_trade(date, Trade.Type.BUY, amount * 0.7)
+        for trade, expected_trade in zip(self.portfolio.investments[0].trades, expected.trades):
+            self.assertEqual(trade.day, expected_trade.day)
+            self.assertAlmostEqual(trade.quantity, expected_trade.quantity)
+
     def test_invest_to(self):
         self.portfolio.invest_to('AAPL', '2021-12-01', 100000)
         self.assertEqual(self.portfolio.principal, 100000)
@@ -110,12 +136,21 @@ class TestPortfolio(unittest.TestCase):
         profit_rate = self.portfolio.get_profit_rate('2021-12-10')
         self.assertGreaterEqual(profit_rate, 0)
 
+    def test_get_cash_flows(self):
+        self.portfolio.invest_all('2021-12-01', 100000)
+        self.portfolio.invest_to('AAPL', '2021-12-05', 100000)
+        days, flows = self.portfolio.get_cash_flows('2021-12-10')
+        self.assertEqual(len(days), 3)
+        self.assertEqual(list(flows[:2]), [-100000, -100000])
+        self.assertEqual(flows[2], self.portfolio.get_valuation('2021-12-10'))
+
     def test_reset(self):
         self.portfolio.invest_all('2021-12-01', 100000)
         self.portfolio.invest_to('AAPL', '2021-12-05', 100000)
         self.portfolio.reset()
         self.assertEqual(self.portfolio.principal, 0)
         self.assertEqual(self.portfolio.cash, 0)
+        self.assertEqual(self.portfolio.contributions, [])
         self.assertGreater(self.portfolio.cash_ratio, 0)
         for investment in self.portfolio.investments:
             self.assertEqual(len(investment.trades), 0)
@@ -125,5 +160,149 @@ class TestPortfolio(unittest.TestCase):
             self.assertNotEqual(investment.asset.is_converted, False)
             self.assertNotEqual(investment.asset.date_range, None)
 
+    def test_clone(self):
+        self.portfolio.invest_all('2021-12-01', 100000)
+        clone = self.portfolio.clone()
+        clone.invest_to('AAPL', '2021-12-05', 100000)
+        self.assertEqual(self.portfolio.principal, 100000)
+        self.assertEqual(clone.principal, 200000)
+        self.assertEqual(len(self.portfolio.investments[0].trades), 1)
+        self.assertEqual(len(clone.investments[0].trades), 2)
+        for investment, cloned in zip(self.portfolio.investments, clone.investments):
+            self.assertIsNot(investment.asset, cloned.asset)
+            self.assertIs(investment.asset.data, cloned.asset.data)
+        self.assertIs(clone.get_price_matrix(), self.portfolio.get_price_matrix())
+        empty = self.portfolio.clone(with_trades=False)
+        self.assertEqual(empty.principal, 0)
+        self.assertEqual(empty.cash, 0)
+        self.assertEqual(len(empty.investments[0].trades), 0)
+
+
+def make_asset(ticker, closes, index):
+    """
+    データを取得せずに、合成した終値からAssetを作成する関数。
+    """
+    asset = Asset.__new__(Asset)
+    asset.asset_type = Asset.Type.STOCK
+    asset.ticker = ticker
+    asset.info = {'currency': 'JPY'}
+    asset.exchange_rate = None
+    asset.target_currency = 'JPY'
+    asset.is_converted = False
+    asset.timezone = 'Asia/Tokyo'
+    asset.data = pd.DataFrame({'Close': closes}, index=index)
+    asset.date_range = (index.min(), index.max())
+    asset._Asset__index_days()
+    return asset
+
+
+def make_portfolio(plan, closes, index):
+    """
+    データを取得せずに、合成した終値からPortfolioを作成する関数。
+    """
+    portfolio = Portfolio.__new__(Portfolio)
+    portfolio.plan = plan
+    portfolio.investments = [Investment(make_asset(ticker, closes[ticker], index))
+                             for ticker in plan if ticker != 'CASH']
+    portfolio.date_range = (index.min(), index.max())
+    portfolio.day_range = (int(portfolio.investments[0].asset.days[0]),
+                           int(portfolio.investments[0].asset.days[-1]))
+    portfolio.principal = 0
+    portfolio.cash_ratio = plan['CASH']['ratio'] if 'CASH' in plan else 0
+    portfolio.cash = 0
+    portfolio.contributions = []
+    portfolio.target_currency = 'JPY'
+    portfolio.fx = FxMatrix()
+    portfolio._Portfolio__price_matrices = {}
+    return portfolio
+
+
+class TestPortfolioSchedule(unittest.TestCase):
+    """
+    データを取得せずに、合成した価格データでinvest_scheduleがinvest_allの繰り返しと一致することを確認するテスト。
+    """
+
+    def setUp(self):
+        # 営業日のみのインデックスとし、週末の積立は次の営業日に行われる
+        index = pd.bdate_range('2024-01-01', periods=60, tz='Asia/Tokyo')
+        rng = np.random.default_rng(0)
+        closes = {'A': 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 60))),
+                  'B': 50 * np.exp(np.cumsum(rng.normal(0, 0.01, 60)))}
+        plan = {'A': {'ratio': 0.6, 'type': 'STOCK'}, 'B': {'ratio': 0.3, 'type': 'STOCK'},
+                'CASH': {'ratio': 0.1, 'type': 'CASH'}}
+        self.schedule = make_portfolio(plan, closes, index)
+        self.loop = make_portfolio(plan, closes, index)
+
+    def test_invest_schedule_matches_invest_all(self):
+        dates = ['2024-01-01', '2024-01-06', '2024-02-01', '2024-02-03', '2024-03-01']
+        amounts = [20000, 20000, 20000, 120000, 30000]
+        self.schedule.invest_schedule(dates, amounts)
+        for date, amount in zip(dates, amounts):
+            self.loop.invest_all(date, amount)
+        self.assertAlmostEqual(self.schedule.principal, self.loop.principal)
+        self.assertAlmostEqual(self.schedule.cash, self.loop.cash)
+        self.assertEqual(self.schedule.contributions, self.loop.contributions)
+        for investment, expected in zip(self.schedule.investments, self.loop.investments):
+            self.assertEqual(len(investment.trades), len(dates))
+            for trade, expected_trade in zip(investment.trades, expected.trades):
+                self.assertEqual(trade.day, expected_trade.day)
+                self.assertAlmostEqual(trade.amount, expected_trade.amount)
+                self.assertAlmostEqual(trade.quantity, expected_trade.quantity)
+        # 週末の日付は次の営業日の終値で購入する
+        self.assertEqual(self.schedule.investments[0].trades[1].date, pd.Timestamp('2024-01-08'))
+        self.assertEqual(self.schedule.get_valuation('2024-03-29'), self.loop.get_valuation('2024-03-29'))
+
+    def test_invest_schedule_scalar_amount(self):
+        dates = ['2024-01-06', '2024-02-01']
+        self.schedule.invest_schedule(dates, 20000)
+        for date in dates:
+            self.loop.invest_all(date, 20000)
+        self.assertAlmostEqual(self.schedule.principal, 40000)
+        for investment, expected in zip(self.schedule.investments, self.loop.investments):
+            self.assertEqual([trade.day for trade in investment.trades],
+                             [trade.day for trade in expected.trades])
+
+
+class TestPortfolioClone(unittest.TestCase):
+    """
+    データを取得せずに、合成した価格データでcloneの独立性を確認するテスト。
+    """
+
+    def setUp(self):
+        index = pd.date_range('2024-01-01', periods=10, freq='D', tz='Asia/Tokyo')
+        self.portfolio = make_portfolio({'A': {'ratio': 0.5, 'type': 'STOCK'}, 'B': {'ratio': 0.5, 'type': 'STOCK'}},
+                                        {'A': np.linspace(100, 110, 10), 'B': np.linspace(50, 40, 10)}, index)
+        self.portfolio.fx.add_rates(pd.DataFrame({'JPY': [140.0, 141.0]},
+                                                 index=pd.DatetimeIndex(['2024-01-01', '2024-01-10'])))
+        self.portfolio.invest_all('2024-01-02', 100000)
+
+    def test_clone_is_independent(self):
+        matrix = self.portfolio.get_price_matrix()
+        version = self.portfolio.get_data_version()
+        clone = self.portfolio.clone()
+        # 価格データは変更するまで共有する
+        self.assertIs(clone.investments[0].asset.closes, self.portfolio.investments[0].asset.closes)
+        self.assertIs(clone.get_price_matrix(), matrix)
+
+        clone.investments[0].trades[0].tax_rate = 0.5
+        clone.investments[0].asset.trim(clone.day_range[0] + 2, clone.day_range[1])
+        clone.investments[1].asset.info['currency'] = 'USD'
+        clone.fx.add_rates(pd.DataFrame({'JPY': [150.0], 'EUR': [0.9]}, index=pd.DatetimeIndex(['2024-01-20'])))
+        clone._Portfolio__price_matrices.clear()
+        clone.invest_all('2024-01-05', 100000)
+
+        original = self.portfolio.investments
+        self.assertEqual(original[0].trades[0].tax_rate, Trade('2024-01-02', Trade.Type.BUY, 1).tax_rate)
+        self.assertEqual(len(original[0].trades), 1)
+        self.assertEqual(len(original[0].asset.days), 10)
+        self.assertEqual(original[1].asset.info['currency'], 'JPY')
+        self.assertEqual(list(self.portfolio.fx.usd_rates.columns), ['JPY'])
+        self.assertEqual(self.portfolio.fx.coverage['JPY'][1], pd.Timestamp('2024-01-10'))
+        self.assertIs(self.portfolio.get_price_matrix(), matrix)
+        self.assertEqual(self.portfolio.get_data_version(), version)
+        self.assertEqual(self.portfolio.principal, 100000)
+        self.assertFalse(original[0].asset.closes.flags.writeable)
+
+
 if __name__ == '__main__':
     unittest.main()
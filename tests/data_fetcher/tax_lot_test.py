@@ -0,0 +1,66 @@
+import unittest
+
+from data_fetcher.tax_lot import LotQueue, TaxLedger
+
+
+class TestLotQueue(unittest.TestCase):
+    def test_consume_fifo(self):
+        queue = LotQueue(capacity=2)
+        queue.push(10, 100)
+        queue.push(10, 200)
+        queue.push(10, 300)
+        self.assertEqual(queue.consume(15), 10 * 100 + 5 * 200)
+        self.assertEqual(len(queue), 2)
+        self.assertEqual(queue.total_quantity, 15)
+        self.assertEqual(queue.total_cost, 5 * 200 + 10 * 300)
+
+    def test_reuses_consumed_space(self):
+        queue = LotQueue(capacity=4)
+        for _ in range(100):
+            queue.push(1, 100)
+            queue.push(1, 100)
+            queue.consume(2)
+        self.assertEqual(len(queue.quantities), 4)
+        self.assertEqual(queue.total_quantity, 0)
+
+
+class TestTaxLedger(unittest.TestCase):
+    def test_fifo(self):
+        ledger = TaxLedger(TaxLedger.Method.FIFO)
+        ledger.buy(10, 100)
+        ledger.buy(10, 200)
+        gain = ledger.sell(10, 150, 0.2, 2024)
+        self.assertEqual(gain, 500)
+        self.assertEqual(ledger.tax, 100)
+        self.assertEqual(ledger.cost, 2000)
+        self.assertEqual(ledger.unrealized_gain(250), 500)
+
+    def test_average(self):
+        ledger = TaxLedger(TaxLedger.Method.AVERAGE)
+        ledger.buy(10, 100)
+        ledger.buy(10, 200)
+        gain = ledger.sell(10, 150, 0.2, 2024)
+        self.assertEqual(gain, 0)
+        self.assertEqual(ledger.tax, 0)
+        self.assertEqual(ledger.cost, 1500)
+
+    def test_losses_offset_within_year(self):
+        ledger = TaxLedger(TaxLedger.Method.FIFO)
+        ledger.buy(30, 100)
+        ledger.sell(10, 150, 0.2, 2024)
+        ledger.sell(10, 50, 0.2, 2024)
+        self.assertEqual(ledger.realized_gain, 0)
+        self.assertEqual(ledger.tax, 0)
+        ledger.sell(10, 50, 0.2, 2025)
+        self.assertEqual(ledger.tax, 0)
+        self.assertEqual(ledger.realized_gain, -500)
+
+    def test_sell_more_than_held(self):
+        ledger = TaxLedger()
+        ledger.buy(10, 100)
+        self.assertEqual(ledger.sell(20, 100, 0.2), 0)
+        self.assertEqual(ledger.quantity, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,285 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from data_fetcher.tax_lot import TaxLedger
+from portfolio_creator.engine import run_dca, schedule_to_steps, SimulationState, ChunkedSimulator, \
+    find_band_rebalances, run_drift_band, unit_values
+from portfolio_creator.scenario import BlockBootstrap
+
+
+class TestEngine(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.prices = np.exp(np.cumsum(rng.normal(0, 0.01, (4, 120, 2)), axis=1)) * 100
+        self.weights = np.array([0.6, 0.3])
+        self.cash_ratio = 0.1
+        self.contributions = np.zeros(120)
+        self.contributions[::20] = 20000
+        self.rebalance = np.zeros(120, dtype=bool)
+        self.rebalance[[59, 100]] = True
+
+    def naive(self, prices):
+        shares = np.zeros(2)
+        cash = 0.0
+        valuations = []
+        for t in range(prices.shape[0]):
+            shares += self.contributions[t] * self.weights / prices[t]
+            cash += self.contributions[t] * self.cash_ratio
+            total = shares @ prices[t] + cash
+            valuations.append(total)
+            if self.rebalance[t]:
+                shares = total * self.weights / prices[t]
+                cash = total * self.cash_ratio
+        return np.array(valuations)
+
+    def test_run_dca_matches_naive_loop(self):
+        valuations, principals, state = run_dca(self.prices, self.weights, self.cash_ratio,
+                                                self.contributions, self.rebalance)
+        for path in range(self.prices.shape[0]):
+            np.testing.assert_allclose(valuations[path], self.naive(self.prices[path]))
+        np.testing.assert_allclose(principals[:, -1], self.contributions.sum())
+        np.testing.assert_allclose(state.principal, self.contributions.sum())
+
+    def test_run_dca_carries_state(self):
+        full, _, _ = run_dca(self.prices, self.weights, self.cash_ratio, self.contributions, self.rebalance)
+        state = SimulationState(4, 2)
+        first, _, _ = run_dca(self.prices[:, :70], self.weights, self.cash_ratio, self.contributions[:70],
+                              self.rebalance[:70], state)
+        second, _, _ = run_dca(self.prices[:, 70:], self.weights, self.cash_ratio, self.contributions[70:],
+                               self.rebalance[70:], state)
+        np.testing.assert_allclose(np.concatenate([first, second], axis=1), full)
+
+    def test_run_dca_with_tax(self):
+        taxed, _, state = run_dca(self.prices, self.weights, self.cash_ratio, self.contributions,
+                                  self.rebalance, tax_rate=0.2)
+        untaxed, _, _ = run_dca(self.prices, self.weights, self.cash_ratio, self.contributions, self.rebalance)
+        self.assertTrue((state.tax_paid >= np.maximum(state.realized_gain, 0) * 0.2 - 1e-6).all())
+        self.assertTrue((taxed[:, -1] <= untaxed[:, -1] + 1e-6).all())
+        np.testing.assert_allclose(taxed[:, :59], untaxed[:, :59])
+
+    def test_run_dca_tax_on_single_rebalance(self):
+        rebalance = np.zeros(120, dtype=bool)
+        rebalance[-1] = True
+        prices = self.prices
+        valuations, _, state = run_dca(prices, self.weights, self.cash_ratio, self.contributions, rebalance,
+                                       tax_rate=0.2)
+        shares = (self.contributions[:, None] * self.weights / prices).sum(axis=1)
+        cost = self.contributions.sum() * self.weights
+        total = (shares * prices[:, -1]).sum(axis=1) + self.contributions.sum() * self.cash_ratio
+        # 税引き後の評価額で設定比率に戻すための売却に対して課税される
+        sold = np.maximum(shares - valuations[:, -1:] * self.weights / prices[:, -1], 0)
+        gain = (sold * prices[:, -1] - cost * sold / shares).sum(axis=1)
+        np.testing.assert_allclose(state.realized_gain, gain)
+        np.testing.assert_allclose(state.tax_paid, np.maximum(gain, 0) * 0.2)
+        np.testing.assert_allclose(valuations[:, -1], total - state.tax_paid)
+
+    def test_run_dca_tax_reconciles(self):
+        rng = np.random.default_rng(8)
+        prices = np.exp(np.cumsum(rng.normal(0.001, 0.02, (50, 500, 2)), axis=1)) * 100
+        contributions = np.zeros(500)
+        contributions[::20] = 20000
+        rebalance = np.zeros(500, dtype=bool)
+        rebalance[60::60] = True
+        valuations, principals, state = run_dca(prices, self.weights, self.cash_ratio, contributions, rebalance,
+                                                tax_rate=0.2)
+        self.assertTrue((state.tax_paid > 0).any())
+        # 現金には含み損益がないため、評価額と投資元本の差は実現損益と含み損益の合計から税額を引いたものになる
+        np.testing.assert_allclose(valuations[:, -1] - principals[:, -1],
+                                   state.realized_gain + state.unrealized_gain(prices[:, -1]) - state.tax_paid,
+                                   rtol=1e-9, atol=1e-6)
+
+    def test_run_dca_tax_matches_tax_ledger(self):
+        # 値動きの大きい1つのアセットを短い年で何度もリバランスし、年内の売却損による還付を含める
+        rng = np.random.default_rng(11)
+        prices = np.exp(np.cumsum(rng.normal(0, 0.05, (1, 300, 1)), axis=1)) * 100
+        weights = np.array([0.9])
+        contributions = np.zeros(300)
+        contributions[::10] = 10000
+        rebalance_steps = list(range(15, 300, 15))
+        steps_per_year = 50
+        state = SimulationState(1, 1)
+        ledger = TaxLedger(TaxLedger.Method.AVERAGE)
+        sale_gains = []
+        start = 0
+        for end in rebalance_steps + [300]:
+            rebalance = np.zeros(end - start, dtype=bool)
+            rebalance[-1] = end < 300
+            shares = state.shares[0, 0]
+            for t in range(start, end):
+                if contributions[t] > 0:
+                    ledger.buy(contributions[t] * weights[0] / prices[0, t, 0], prices[0, t, 0])
+                    shares += contributions[t] * weights[0] / prices[0, t, 0]
+            _, _, state = run_dca(prices[:, start:end], weights, 0.1, contributions[start:end], rebalance, state,
+                                  tax_rate=0.2, steps_per_year=steps_per_year)
+            # リバランスでの売買を台帳に記録する
+            traded = state.shares[0, 0] - shares
+            price = prices[0, end - 1, 0]
+            if traded > 0:
+                ledger.buy(traded, price)
+            elif traded < 0:
+                realized_gain = ledger.realized_gain
+                ledger.sell(-traded, price, 0.2, (end - 1) // steps_per_year)
+                sale_gains.append(ledger.realized_gain - realized_gain)
+            start = end
+        # 売却損を年内の売却益と通算しているため、売却ごとに課税した場合より税額が小さい
+        self.assertLess(ledger.tax, np.maximum(sale_gains, 0).sum() * 0.2 - 1)
+        self.assertAlmostEqual(state.tax_paid[0], ledger.tax, delta=1e-6)
+        self.assertAlmostEqual(state.realized_gain[0], ledger.realized_gain, delta=1e-6)
+        self.assertAlmostEqual(state.cost_basis[0, 0], ledger.cost, delta=1e-6)
+        self.assertAlmostEqual(state.shares[0, 0], ledger.quantity, delta=1e-9)
+
+    def test_schedule_to_steps(self):
+        index = pd.DatetimeIndex(['2024-01-02', '2024-01-03', '2024-02-01', '2024-02-02'])
+        steps = schedule_to_steps(index, ['2024-01-01', '2024-02-01', '2024-03-01'], [100, 200, 300])
+        np.testing.assert_array_equal(steps, [100, 0, 200, 0])
+        # タイムゾーン付きの日付は現地の日付で比較する
+        dates = pd.date_range('2024-01-01', '2024-03-01', freq='MS', tz='America/New_York')
+        np.testing.assert_array_equal(schedule_to_steps(index, dates, [100, 200, 300]), [100, 0, 200, 0])
+        np.testing.assert_array_equal(schedule_to_steps(index.tz_localize('Asia/Tokyo'), dates, 50), [50, 0, 50, 0])
+
+
+class TestDriftBand(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.prices = np.exp(np.cumsum(rng.normal(0.0003, 0.015, (2000, 3)), axis=0)) * 100
+        self.weights = np.array([0.5, 0.2, 0.2])
+        self.targets = np.append(self.weights, 0.1)
+        self.contributions = np.zeros(2000)
+        self.contributions[::21] = 20000
+
+    def naive(self, band, relative):
+        shares = np.zeros(3)
+        cash = 0.0
+        steps = []
+        for t in range(len(self.prices)):
+            shares += self.contributions[t] * self.weights / self.prices[t]
+            cash += self.contributions[t] * 0.1
+            total = shares @ self.prices[t] + cash
+            drift = np.append(shares * self.prices[t], cash) / total - self.targets
+            if relative:
+                drift /= self.targets
+            if (np.abs(drift) > band).any():
+                steps.append(t)
+                shares = total * self.weights / self.prices[t]
+                cash = total * 0.1
+        return steps
+
+    def test_absolute_band_matches_daily_check(self):
+        rebalance = find_band_rebalances(self.prices, self.weights, 0.1, self.contributions, 0.05)
+        self.assertGreater(rebalance.sum(), 0)
+        self.assertEqual(list(np.flatnonzero(rebalance)), self.naive(0.05, False))
+
+    def test_relative_band_matches_daily_check(self):
+        rebalance = find_band_rebalances(self.prices, self.weights, 0.1, self.contributions, 0.2, relative=True,
+                                         window=16)
+        self.assertEqual(list(np.flatnonzero(rebalance)), self.naive(0.2, True))
+
+    def test_invalid_window(self):
+        for window in (0, -1):
+            with self.assertRaises(ValueError):
+                find_band_rebalances(self.prices, self.weights, 0.1, self.contributions, 0.05, window=window)
+
+    def test_detection_carries_state_and_tax(self):
+        full = find_band_rebalances(self.prices, self.weights, 0.1, self.contributions, 0.05, tax_rate=0.2)
+        _, _, state = run_dca(self.prices[None, :1000], self.weights, 0.1, self.contributions[:1000], full[:1000],
+                              tax_rate=0.2)
+        second = find_band_rebalances(self.prices[1000:], self.weights, 0.1, self.contributions[1000:], 0.05,
+                                      state=state, tax_rate=0.2)
+        self.assertGreater(second.sum(), 0)
+        np.testing.assert_array_equal(second, full[1000:])
+
+    def test_run_drift_band_in_chunks(self):
+        prices = np.stack([self.prices, self.prices[::-1]])
+        full, _, _, full_rebalances = run_drift_band(prices, self.weights, 0.1, self.contributions, 0.05,
+                                                     tax_rate=0.2)
+        state = SimulationState(2, 3)
+        first, _, _, first_rebalances = run_drift_band(prices[:, :700], self.weights, 0.1, self.contributions[:700],
+                                                       0.05, state=state, tax_rate=0.2)
+        second, _, _, second_rebalances = run_drift_band(prices[:, 700:], self.weights, 0.1,
+                                                         self.contributions[700:], 0.05, state=state, tax_rate=0.2)
+        np.testing.assert_array_equal(np.concatenate([first_rebalances, second_rebalances], axis=1),
+                                      full_rebalances)
+        np.testing.assert_allclose(np.concatenate([first, second], axis=1), full)
+
+    def test_run_drift_band(self):
+        prices = np.stack([self.prices, self.prices[::-1]])
+        valuations, _, state, rebalances = run_drift_band(prices, self.weights, 0.1, self.contributions, 0.05)
+        for path in range(2):
+            expected, _, _ = run_dca(prices[path:path + 1], self.weights, 0.1, self.contributions, rebalances[path])
+            np.testing.assert_allclose(valuations[path], expected[0])
+        np.testing.assert_allclose(state.principal, self.contributions.sum())
+
+
+class TestChunkedSimulator(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        prices = np.exp(np.cumsum(rng.normal(0.0003, 0.01, (1000, 3)), axis=0)) * 100
+        self.bootstrap = BlockBootstrap.from_prices(prices, block_length=20)
+        self.contributions = np.zeros(600)
+        self.contributions[::21] = 20000
+        self.rebalance = np.zeros(600, dtype=bool)
+        self.rebalance[::252] = True
+        self.weights = np.array([0.5, 0.3, 0.1])
+
+    def simulator(self, memory_budget):
+        return ChunkedSimulator(self.bootstrap, self.weights, 0.1, self.contributions, self.rebalance,
+                                memory_budget=memory_budget)
+
+    def test_chunk_shape_respects_budget(self):
+        paths, steps = self.simulator(2 ** 20).chunk_shape(1000)
+        self.assertLess(paths * steps * 8 * (ChunkedSimulator.ARRAYS_PER_CELL * 3 + 4), 2 ** 20)
+        self.assertEqual(self.simulator(2 ** 30).chunk_shape(1000), (1000, 600))
+
+    def test_results_do_not_depend_on_chunking(self):
+        whole = list(self.simulator(2 ** 30).run(300, seed=7))
+        chunked = list(self.simulator(2 ** 20).run(300, seed=7))
+        self.assertGreater(len(chunked), 1)
+        for key in ('final_valuation', 'principal', 'max_drawdown'):
+            np.testing.assert_allclose(np.concatenate([result[key] for result in chunked]), whole[0][key])
+
+    def test_matches_run_dca(self):
+        starts = self.bootstrap.sample_block_starts(50, 600, np.random.default_rng(3))
+        log_returns = self.bootstrap.gather(starts, 0, 600)
+        log_returns[:, 0] = 0
+        prices = self.bootstrap.initial_prices * np.exp(np.cumsum(log_returns, axis=1))
+        valuations, _, _ = run_dca(prices, self.weights, 0.1, self.contributions, self.rebalance)
+        result = next(self.simulator(2 ** 20).run(50, seed=3))
+        np.testing.assert_allclose(result['final_valuation'], valuations[:, -1])
+
+    def test_xirr_matches_cash_flows(self):
+        result = next(self.simulator(2 ** 30).run(20, seed=2))
+        steps = np.flatnonzero(self.contributions)
+        times = np.append(steps, 599) / 252
+        for path in range(20):
+            rate = result['xirr'][path]
+            npv = (-self.contributions[steps] * (1 + rate) ** -times[:-1]).sum() \
+                + result['final_valuation'][path] * (1 + rate) ** -times[-1]
+            self.assertAlmostEqual(npv / result['principal'][path], 0.0, places=8)
+
+    def test_drawdown_excludes_contributions(self):
+        # 現金のみの積立では評価額は積立で増えるだけなので、ドローダウンは0となる
+        simulator = ChunkedSimulator(self.bootstrap, np.zeros(3), 1.0, self.contributions, memory_budget=2 ** 20)
+        result = next(simulator.run(10, seed=0))
+        np.testing.assert_allclose(result['max_drawdown'], 0.0)
+
+    def test_unit_values_follow_price(self):
+        prices = self.bootstrap.sample_prices(5, 300, seed=1)[:, :, :1]
+        valuations, _, _ = run_dca(prices, [1.0], 0.0, self.contributions[:300])
+        units = unit_values(valuations, self.contributions[:300], np.zeros(5), np.ones(5))
+        np.testing.assert_allclose(units, prices[:, :, 0] / prices[:, :1, 0])
+
+    def test_invalid_inputs(self):
+        with self.assertRaises(ValueError):
+            ChunkedSimulator(self.bootstrap, self.weights, 0.1, [])
+        result = next(ChunkedSimulator(self.bootstrap, self.weights, 0.1, np.zeros(30)).run(5, seed=0))
+        self.assertTrue(np.isnan(result['return']).all())
+
+    def test_summarize(self):
+        metrics = self.simulator(2 ** 20).summarize(300, seed=1)
+        self.assertEqual(metrics.returns.count, 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from portfolio_creator.result_cache import ResultCache, make_key, MISSING
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.temp_dir.name, max_bytes=10 ** 6)
+        self.plan = {'AAPL': {'ratio': 1, 'type': 'STOCK'}}
+        self.version = {'AAPL': '19000-19500-350-150.0-JPY'}
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_make_key(self):
+        schedule = np.full(24, 20000.0)
+        key = make_key(self.plan, self.version, schedule, {'band': 0.05}, seed=1)
+        self.assertEqual(key, make_key(dict(self.plan), dict(self.version), schedule.copy(), {'band': 0.05}, 1))
+        self.assertNotEqual(key, make_key(self.plan, self.version, schedule, {'band': 0.05}, seed=2))
+        self.assertNotEqual(key, make_key(self.plan, {'AAPL': '19000-19501-351-151.0-JPY'}, schedule,
+                                          {'band': 0.05}, seed=1))
+
+    def test_make_key_hashes_pandas_content(self):
+        # 長いpandasのオブジェクトは文字列表現が省略されるため、途中の違いも内容で区別する
+        index = pd.date_range('2000-01-01', periods=480, freq='MS')
+        schedule = pd.Series(20000.0, index=index)
+        bonus = schedule.copy()
+        bonus.iloc[200] += 100000
+        self.assertNotEqual(make_key(self.plan, self.version, schedule), make_key(self.plan, self.version, bonus))
+        self.assertEqual(make_key(self.plan, self.version, schedule),
+                         make_key(self.plan, self.version, schedule.copy()))
+        frame = pd.DataFrame({'amount': schedule, 'rebalance': False})
+        changed = frame.copy()
+        changed.iloc[240, 1] = True
+        self.assertNotEqual(make_key(self.plan, self.version, frame), make_key(self.plan, self.version, changed))
+        shifted = pd.Series(20000.0, index=index + pd.DateOffset(days=1))
+        self.assertNotEqual(make_key(self.plan, self.version, schedule),
+                            make_key(self.plan, self.version, shifted))
+
+    def test_make_key_rejects_unknown_types(self):
+        with self.assertRaises(TypeError):
+            make_key(self.plan, self.version, object())
+
+    def test_get_or_compute(self):
+        calls = []
+        compute = lambda: calls.append(1) or {'mean': 0.1}
+        self.assertEqual(self.cache.get_or_compute('a', compute), {'mean': 0.1})
+        self.assertEqual(self.cache.get_or_compute('a', compute), {'mean': 0.1})
+        self.assertEqual(len(calls), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIs(self.cache.get('b', MISSING), MISSING)
+
+    def test_cached_none_is_a_hit(self):
+        calls = []
+        compute = lambda: calls.append(1)
+        self.assertIsNone(self.cache.get_or_compute('a', compute))
+        self.assertIsNone(self.cache.get_or_compute('a', compute))
+        self.assertEqual(len(calls), 1)
+        self.assertIsNone(self.cache.get('a', MISSING))
+
+    def test_lru_eviction(self):
+        cache = ResultCache(self.temp_dir.name, max_entries=2)
+        for i, key in enumerate(('a', 'b')):
+            cache.put(key, i)
+            os.utime(os.path.join(self.temp_dir.name, key + ResultCache.SUFFIX), (i, i))
+        cache.get('a')
+        cache.put('c', 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 0)
+        self.assertEqual(cache.get('c'), 2)
+
+    def test_size_eviction(self):
+        cache = ResultCache(self.temp_dir.name, max_bytes=20000)
+        for key in ('a', 'b', 'c'):
+            cache.put(key, np.zeros(1000))
+        self.assertLessEqual(sum(entry.stat().st_size for entry in os.scandir(self.temp_dir.name)), 20000)
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_invalidate(self):
+        self.cache.put('a', 1, self.version)
+        self.cache.put('b', 2, {'GOOGL': 'v1'})
+        removed = self.cache.invalidate({'AAPL': '19000-19501-351-151.0-JPY', 'GOOGL': 'v1'})
+        self.assertEqual(removed, 1)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('b'), 2)
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), ['b.json', 'b.pkl'])
+
+    def test_invalidate_does_not_load_results(self):
+        self.cache.put('a', 1, self.version)
+        # 結果のファイルが壊れていても、バージョンのファイルだけで判定できる
+        with open(os.path.join(self.temp_dir.name, 'a' + ResultCache.SUFFIX), 'wb') as f:
+            f.write(b'broken')
+        self.assertEqual(self.cache.invalidate(self.version), 0)
+        self.cache.clear()
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
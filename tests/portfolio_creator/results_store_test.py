@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from portfolio_creator.results_store import ResultsStore
+
+
+class TestResultsStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = ResultsStore(os.path.join(self.temp_dir.name, 'results.sqlite'))
+        rng = np.random.default_rng(0)
+        self.plans = [{'AAPL': {'ratio': ratio, 'type': 'STOCK'}, 'CASH': {'ratio': 1 - ratio, 'type': 'CASH'}}
+                      for ratio in (0.5, 0.7, 0.9)]
+        self.returns = [rng.normal(mean, 0.1, 1000) for mean in (0.02, 0.05, 0.03)]
+
+    def tearDown(self):
+        self.store.close()
+        self.temp_dir.cleanup()
+
+    def test_append_run_and_rank(self):
+        run_ids = [self.store.append_run(plan, {'seed': 0}, {'return': returns})
+                   for plan, returns in zip(self.plans, self.returns)]
+        ranking = self.store.rank_plans('return')
+        self.assertEqual(list(ranking['run_id']), [run_ids[1], run_ids[2], run_ids[0]])
+        self.assertAlmostEqual(ranking['value'].iloc[0], self.returns[1].mean())
+        self.assertEqual(len(self.store.rank_plans('return', 'p05', ascending=True, limit=1)), 1)
+
+    def test_rank_uses_latest_run_per_plan(self):
+        self.store.append_run(self.plans[0], {}, {'return': self.returns[0]})
+        latest = self.store.append_run(self.plans[0], {}, {'return': self.returns[1]})
+        ranking = self.store.rank_plans('return')
+        self.assertEqual(list(ranking['run_id']), [latest])
+
+    def test_rank_skips_unfinished_runs(self):
+        finished = self.store.append_run(self.plans[0], {}, {'return': self.returns[0]})
+        # 集計前の最新の実行があっても、集計済みの実行で順位付けする
+        unfinished = self.store.start_run(self.plans[0])
+        self.store.append_paths(unfinished, {'return': self.returns[1]})
+        ranking = self.store.rank_plans('return')
+        self.assertEqual(list(ranking['run_id']), [finished])
+
+    def test_rank_filters_runs(self):
+        first = [self.store.append_run(plan, {'sweep': 'a', 'seed': 0}, {'return': returns})
+                 for plan, returns in zip(self.plans, self.returns)]
+        second = [self.store.append_run(plan, {'sweep': 'b', 'seed': 0}, {'return': -returns})
+                  for plan, returns in zip(self.plans[:2], self.returns)]
+        ranking = self.store.rank_plans('return', params={'sweep': 'a'})
+        self.assertEqual(list(ranking['run_id']), [first[1], first[2], first[0]])
+        self.assertEqual(set(self.store.rank_plans('return', params={'seed': 0})['run_id']),
+                         {second[0], second[1], first[2]})
+        self.assertEqual(list(self.store.rank_plans('return', run_ids=second)['run_id']), [second[0], second[1]])
+        self.assertEqual(len(self.store.rank_plans('return', params={'sweep': 'c'})), 0)
+
+    def test_append_paths_in_chunks(self):
+        run_id = self.store.start_run(self.plans[0])
+        for chunk in np.array_split(self.returns[0], 4):
+            self.store.append_paths(run_id, {'return': chunk, 'max_drawdown': np.abs(chunk)})
+        self.store.finish_run(run_id)
+        paths = self.store.load_paths(run_id)
+        np.testing.assert_allclose(paths['return'].to_numpy(), self.returns[0])
+        comparison = self.store.compare([run_id], ['return', 'max_drawdown'], 'p50')
+        self.assertAlmostEqual(comparison.loc[run_id, 'return'], np.median(self.returns[0]))
+
+    def test_curves(self):
+        curves = np.cumsum(np.ones((3, 10)), axis=1)
+        run_id = self.store.append_run(self.plans[0], {}, {'return': curves[:, -1]}, curves)
+        np.testing.assert_array_equal(self.store.load_curve(run_id, 2), curves[2])
+        self.assertIsNone(self.store.load_curve(run_id, 5))
+
+    def test_invalid_metric(self):
+        with self.assertRaises(ValueError):
+            self.store.append_run(self.plans[0], {}, {'return; DROP TABLE runs': self.returns[0]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from portfolio_creator.risk_metrics import RunningMoments, QuantileSketch, DrawdownTracker, RiskMetrics
+
+
+class TestRiskMetrics(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.returns = rng.normal(0.05, 0.2, 100000)
+        self.equity = np.cumprod(1 + rng.normal(0.0005, 0.01, (50, 300)), axis=1)
+
+    def test_running_moments_match_numpy(self):
+        moments = RunningMoments()
+        for chunk in np.array_split(self.returns, 7):
+            moments.update(chunk)
+        self.assertEqual(moments.count, len(self.returns))
+        self.assertAlmostEqual(moments.mean, self.returns.mean(), places=12)
+        self.assertAlmostEqual(moments.variance(), self.returns.var(ddof=1), places=12)
+
+    def test_non_finite_values_are_skipped(self):
+        values = np.concatenate([self.returns[:1000], [np.nan, np.inf, -np.inf]])
+        metrics = RiskMetrics()
+        metrics.update(values)
+        self.assertEqual(metrics.returns.count, 1000)
+        self.assertEqual(metrics.downside.count, 1000)
+        self.assertEqual(metrics.return_sketch.count, 1000)
+        self.assertAlmostEqual(metrics.returns.mean, self.returns[:1000].mean(), places=12)
+
+    def test_quantile_sketch_relative_accuracy(self):
+        sketch = QuantileSketch(0.01)
+        sketch.update(self.returns)
+        for q in (0.01, 0.05, 0.5, 0.95, 0.99):
+            exact = np.quantile(self.returns, q, method='lower')
+            self.assertLessEqual(abs(sketch.quantile(q) - exact), 0.01 * abs(exact) + 1e-12)
+
+    def test_drawdown_tracker_chunks(self):
+        tracker = DrawdownTracker(self.equity.shape[0])
+        for chunk in np.array_split(self.equity, 4, axis=1):
+            tracker.update(chunk)
+        peak = np.maximum.accumulate(self.equity, axis=1)
+        np.testing.assert_allclose(tracker.max_drawdown, (1 - self.equity / peak).max(axis=1))
+
+    def test_merge_matches_single_pass(self):
+        single = RiskMetrics()
+        single.update(self.returns)
+        merged = RiskMetrics()
+        for chunk in np.array_split(self.returns, 5):
+            worker = RiskMetrics()
+            worker.update(chunk)
+            merged.merge(pickle.loads(pickle.dumps(worker)))
+        expected, actual = single.summary(), merged.summary()
+        for key in ('mean', 'std', 'p05', 'p95', 'var', 'cvar', 'sharpe', 'sortino'):
+            self.assertAlmostEqual(expected[key], actual[key], places=9)
+
+    def test_summary_within_tolerance(self):
+        metrics = RiskMetrics(relative_accuracy=0.01)
+        metrics.update(self.returns)
+        summary = metrics.summary()
+        tail = np.sort(self.returns)[:int(0.05 * len(self.returns))]
+        self.assertAlmostEqual(summary['sharpe'], self.returns.mean() / self.returns.std(ddof=1), places=9)
+        self.assertLessEqual(abs(summary['var'] + np.quantile(self.returns, 0.05, method='lower')),
+                             0.01 * abs(summary['var']))
+        self.assertLessEqual(abs(summary['cvar'] + tail.mean()), 0.01 * abs(tail.mean()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+import numpy as np
+
+from portfolio_creator.scenario import BlockBootstrap, historical_windows
+
+
+class TestBlockBootstrap(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.prices = np.exp(np.cumsum(rng.normal(0, 0.01, (500, 3)), axis=0)) * [100, 50, 1000]
+        self.bootstrap = BlockBootstrap.from_prices(self.prices, block_length=10)
+
+    def test_sample_prices_shape(self):
+        paths = self.bootstrap.sample_prices(1000, 60, seed=0)
+        self.assertEqual(paths.shape, (1000, 60, 3))
+        np.testing.assert_allclose(paths[:, 0], np.broadcast_to(self.prices[-1], (1000, 3)))
+
+    def test_sample_is_reproducible(self):
+        np.testing.assert_array_equal(self.bootstrap.sample_prices(10, 30, seed=5),
+                                      self.bootstrap.sample_prices(10, 30, seed=5))
+
+    def test_blocks_keep_cross_asset_returns(self):
+        log_returns = self.bootstrap.sample_log_returns(50, 40, np.random.default_rng(2))
+        # 抽出した各時点のリターンはすべてのアセットで同じ日のもの
+        history = {tuple(row) for row in np.round(self.bootstrap.log_returns, 12)}
+        for row in np.round(log_returns.reshape(-1, 3), 12):
+            self.assertIn(tuple(row), history)
+
+    def test_invalid_block_length(self):
+        with self.assertRaises(ValueError):
+            BlockBootstrap.from_prices(self.prices, block_length=0)
+
+    def test_historical_windows(self):
+        starts, windows = historical_windows(self.prices, 100, n_paths=20, seed=0)
+        self.assertEqual(windows.shape, (20, 100, 3))
+        np.testing.assert_array_equal(windows[3], self.prices[starts[3]:starts[3] + 100])
+
+
+if __name__ == '__main__':
+    unittest.main()
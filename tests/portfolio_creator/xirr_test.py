@@ -0,0 +1,34 @@
+import unittest
+
+import numpy as np
+
+from portfolio_creator.xirr import xirr, dca_cash_flows
+
+
+class TestXirr(unittest.TestCase):
+    def test_single_period(self):
+        self.assertAlmostEqual(xirr([-100, 110], [0, 1]), 0.1, places=10)
+        self.assertAlmostEqual(xirr([-100, 81], [0, 2]), -0.1, places=10)
+
+    def test_no_sign_change(self):
+        self.assertTrue(np.isnan(xirr([-100, 0], [0, 1])))
+        self.assertTrue(np.isnan(xirr([100, 100], [0, 1])))
+
+    def test_batched_matches_npv_root(self):
+        days = np.arange(0, 360 * 30, 30)
+        valuations = np.random.default_rng(0).uniform(0.5, 5, 2000) * len(days) * 20000
+        cash_flows, times = dca_cash_flows(days, 20000, days[-1] + 30, valuations)
+        rates = xirr(cash_flows, times)
+        self.assertEqual(rates.shape, (2000,))
+        discounted = (cash_flows * (1 + rates[:, None]) ** (times.max() - times)).sum(axis=1)
+        np.testing.assert_allclose(discounted / np.abs(cash_flows).sum(axis=1), 0, atol=1e-10)
+
+    def test_batched_matches_scalar(self):
+        cash_flows = np.array([[-100, -100, 250], [-100, -100, 150]])
+        rates = xirr(cash_flows, [0, 1, 2])
+        for row, rate in zip(cash_flows, rates):
+            self.assertAlmostEqual(xirr(row, [0, 1, 2]), rate, places=12)
+
+
+if __name__ == '__main__':
+    unittest.main()